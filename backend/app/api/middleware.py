@@ -0,0 +1,167 @@
+import time
+from typing import Dict, Iterable
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from config import settings
+from app.services.fair_scheduler import ClientRateLimiter, client_id, retry_after_header, set_request_client
+from app.services.metrics import (
+    metrics, start_request_timings, reset_request_timings, server_timing_header
+)
+
+REQUEST_DURATION = metrics.histogram(
+    "valper_http_request_duration_seconds",
+    "HTTP request latency by handler",
+    labels=("method", "handler", "status")
+)
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    "valper_http_requests_in_flight",
+    "HTTP requests currently being served"
+)
+BYTES_IN = metrics.counter(
+    "valper_http_request_bytes_total",
+    "Request body bytes received",
+    labels=("handler",)
+)
+BYTES_OUT = metrics.counter(
+    "valper_http_response_bytes_total",
+    "Response body bytes sent",
+    labels=("handler",)
+)
+
+class UploadLimitMiddleware:
+    """ASGI middleware rejecting request bodies larger than a per-path limit with 413
+    
+    A Content-Length over the limit is refused before any of the body is
+    read. Bodies sent without one (chunked uploads) are counted as they
+    arrive, and the request fails as soon as the limit is crossed instead
+    of after the whole upload has been spooled.
+    """
+    
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = {path: limit for path, limit in limits.items() if limit > 0}
+    
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+        
+        detail = f"Request body is larger than the {limit} byte limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing, which FastAPI turns into the 413 response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+class RateLimitMiddleware:
+    """ASGI middleware identifying each client and applying its token bucket
+    
+    Clients are identified by their X-API-Key header if it is one of
+    ``api_keys``, otherwise by address, and model work done for the
+    request is attributed to them. Over the limit, HTTP requests get 429 with a Retry-After header
+    and WebSocket connections are closed with 1013 (try again later).
+    """
+    
+    def __init__(self, app, limiter: ClientRateLimiter, exempt: Iterable[str] = (), api_keys: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.exempt = set(exempt)
+        self.api_keys = frozenset(api_keys)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        
+        api_key = dict(scope["headers"]).get(b"x-api-key")
+        host = scope["client"][0] if scope.get("client") else None
+        client = client_id(api_key.decode("latin-1") if api_key else None, host, self.api_keys)
+        set_request_client(client)
+        
+        # CORS preflights are answered by CORSMiddleware and cost nothing
+        if scope["path"] not in self.exempt and scope.get("method") != "OPTIONS":
+            wait = self.limiter.check(client)
+            if wait:
+                if scope["type"] == "websocket":
+                    await send({"type": "websocket.close", "code": 1013})
+                    return
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Rate limit exceeded"},
+                    headers={"Retry-After": retry_after_header(wait)}
+                )
+                await response(scope, receive, send)
+                return
+        
+        await self.app(scope, receive, send)
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-handler latency, in-flight requests and bytes in/out
+    
+    Handlers are labelled by endpoint name rather than path, so routes with
+    path parameters (e.g. /audio/{filename}) don't create a series per file.
+    When SERVER_TIMING_ENABLED is set, stage timings recorded with
+    metrics.timed() during the request are returned in a Server-Timing header.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        timings, token = start_request_timings()
+        state = {"status": 500, "bytes_in": 0, "bytes_out": 0}
+        REQUESTS_IN_FLIGHT.inc()
+        
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["bytes_in"] += len(message.get("body", b""))
+            return message
+        
+        async def instrumented_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    header = server_timing_header(timings)
+                    if header:
+                        message = dict(message)
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"server-timing", header.encode("latin-1"))
+                        ]
+            elif message["type"] == "http.response.body":
+                state["bytes_out"] += len(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, counting_receive, instrumented_send)
+        finally:
+            reset_request_timings(token)
+            REQUESTS_IN_FLIGHT.dec()
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"], handler=handler, status=str(state["status"])
+            )
+            BYTES_IN.inc(state["bytes_in"], handler=handler)
+            BYTES_OUT.inc(state["bytes_out"], handler=handler)
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from app.services.stt_service import STTService
+from app.services.audio_decode import AudioTooLongError
 from app.services.tts_service import TTSService
+from app.services.stt_stream import StreamingTranscriber
+from app.services.job_queue import job_to_dict
+from app.services.fair_scheduler import OverloadedError, scheduler
+from app.services import workers
+from config import settings
+from app.services.audio_encoding import FORMATS, STREAMABLE_FORMATS, media_type, negotiate_format
+import asyncio
 import tempfile
 import os
 import logging
 import datetime
+import json
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +26,41 @@ router = APIRouter()
 # Services will be injected from main.py
 stt_service = None
 tts_service = None
+job_scheduler = None
+rate_limiter = None
 
 class TTSRequest(BaseModel):
     text: str
     voice: str = 'af_heart'
+    format: Optional[str] = None  # wav, pcm, flac, ogg (Opus) or mp3; negotiated from Accept if omitted
+    sample_rate: Optional[int] = None
+    bitrate: Optional[str] = None
+
+class TTSJobRequest(BaseModel):
+    items: List[TTSRequest]
 
 class ConversationRequest(BaseModel):
     message: str
 
+def _overloaded(error: OverloadedError) -> HTTPException:
+    """Build the 503 returned when the TTS pool or the scheduler cannot admit more work"""
+    return HTTPException(
+        status_code=503,
+        detail=f"{error}, try again later",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def _output_format(request: TTSRequest, accept: Optional[str], allowed=FORMATS) -> str:
+    """Resolve and validate the requested TTS output format"""
+    fmt = (request.format or negotiate_format(accept) or 'wav').lower()
+    if fmt not in allowed:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Supported formats: {list(allowed)}")
+    if request.sample_rate is not None and not 8000 <= request.sample_rate <= 48000:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 8000 and 48000")
+    if request.bitrate is not None and not re.fullmatch(r"\d{1,3}k", request.bitrate):
+        raise HTTPException(status_code=400, detail="bitrate must look like '32k'")
+    return fmt
+
 @router.get("/test")
 async def test_endpoint():
     """Simple test endpoint to verify the API is working"""
@@ -39,11 +77,37 @@ async def health_check():
     return {
         "status": "healthy",
         "stt_ready": stt_service.is_ready if stt_service else False,
-        "tts_ready": tts_service.is_ready if tts_service else False
+        "tts_ready": tts_service.is_ready if tts_service else False,
+        "tts_cache": tts_service.cache.stats() if tts_service and tts_service.cache else None,
+        "stt_result_cache": stt_service.result_cache.stats() if stt_service and stt_service.result_cache else None,
+        "tts_queue": tts_service.get_queue_stats() if tts_service else None,
+        "tts_voices": tts_service.get_voice_stats() if tts_service else None,
+        "audio_store": tts_service.audio_store.get_stats() if tts_service else None,
+        "jobs": job_scheduler.get_stats() if job_scheduler else None,
+        "scheduler": scheduler.get_stats(),
+        "rate_limit": rate_limiter.get_stats() if rate_limiter else None,
+        "worker": workers.current_worker["index"] if workers.current_worker else None,
+        "workers": workers.read_workers(settings.WORKERS_STATE_DIR, settings.WORKER_HEARTBEAT_SECONDS)
+        if workers.current_worker else None
+    }
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the STT and TTS models are loaded, 503 with their progress until then"""
+    ready = bool(stt_service and stt_service.is_ready and tts_service and tts_service.is_ready)
+    body = {
+        "ready": ready,
+        "models": {
+            "stt": stt_service.loading.to_dict() if stt_service else None,
+            "tts": tts_service.loading.to_dict() if tts_service else None
+        }
     }
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
 @router.post("/stt")
-async def speech_to_text(audio: UploadFile = File(...)):
+async def speech_to_text(audio: UploadFile = File(...), model: Optional[str] = Form(None)):
     """Convert speech to text"""
     if not stt_service:
         raise HTTPException(status_code=503, detail="STT service not available")
@@ -54,15 +118,17 @@ async def speech_to_text(audio: UploadFile = File(...)):
     if not audio.content_type.startswith('audio/'):
         raise HTTPException(status_code=400, detail="File must be an audio file")
     
+    if model and model not in stt_service.get_available_models():
+        raise HTTPException(status_code=400, detail=f"Unknown model. Available models: {stt_service.get_available_models()}")
+    
     try:
-        # Read audio file content
-        content = await audio.read()
-        
-        if len(content) == 0:
+        if not audio.size:
             raise HTTPException(status_code=400, detail="Audio file is empty")
         
-        # Transcribe audio using bytes
-        result = await stt_service.transcribe_audio(content)
+        # Decode straight from the spooled upload rather than a copy of its bytes
+        result = await stt_service.transcribe_audio(
+            audio.file, model_name=model, duration_limit=settings.STT_MAX_DURATION_S or None
+        )
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to transcribe audio"))
@@ -71,12 +137,176 @@ async def speech_to_text(audio: UploadFile = File(...)):
         
     except HTTPException:
         raise
+    except OverloadedError as e:
+        raise _overloaded(e)
+    except AudioTooLongError as e:
+        raise HTTPException(status_code=413, detail=f"{e}; use /stt/long for longer recordings")
     except Exception as e:
         logger.error(f"Error in STT endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _is_end_event(text: str) -> bool:
+    """Check whether a WebSocket text frame is the client's {"event": "end"} message"""
+    try:
+        return json.loads(text).get("event") == "end"
+    except (ValueError, AttributeError):
+        return False
+
+@router.websocket("/stt/stream")
+async def speech_to_text_stream(websocket: WebSocket,
+                                sample_rate: int = 16000,
+                                language: Optional[str] = None,
+                                model: Optional[str] = None):
+    """Real-time speech to text over a WebSocket
+    
+    The client sends binary frames of 16-bit little-endian mono PCM and a
+    text frame {"event": "end"} when done. The server replies with
+    {"type": "partial"|"final", "utterance": n, "text": ...} messages.
+    """
+    await websocket.accept()
+    
+    if not stt_service or not stt_service.is_ready:
+        await websocket.close(code=1013, reason="STT service not ready")
+        return
+    
+    if not 8000 <= sample_rate <= 48000:
+        await websocket.close(code=1008, reason="sample_rate must be between 8000 and 48000")
+        return
+    
+    if model and model not in stt_service.get_available_models():
+        await websocket.close(code=1008, reason="Unknown model")
+        return
+    
+    transcriber = StreamingTranscriber(
+        stt_service, websocket.send_json,
+        sample_rate=sample_rate, language=language, model_name=model
+    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                await transcriber.feed_pcm16(message["bytes"])
+            elif message.get("text") and _is_end_event(message["text"]):
+                break
+        
+        await transcriber.finish()
+        await websocket.send_json({"type": "done"})
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        logger.info("STT stream client disconnected")
+        transcriber.close()
+    except Exception as e:
+        logger.error(f"Error in STT stream: {e}")
+        transcriber.close()
+        await websocket.close(code=1011)
+
+@router.post("/stt/detect-language")
+async def detect_language(audio: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    """Detect the spoken language from the first seconds of speech"""
+    if not stt_service:
+        raise HTTPException(status_code=503, detail="STT service not available")
+    
+    if not stt_service.is_ready:
+        raise HTTPException(status_code=503, detail="STT service not ready")
+    
+    if not audio.content_type.startswith('audio/'):
+        raise HTTPException(status_code=400, detail="File must be an audio file")
+    
+    if not audio.size:
+        raise HTTPException(status_code=400, detail="Audio file is empty")
+    
+    try:
+        result = await stt_service.detect_language(audio.file, session_id=session_id)
+    except OverloadedError as e:
+        raise _overloaded(e)
+    if result["language"] == "unknown":
+        raise HTTPException(status_code=500, detail="Failed to detect language")
+    
+    probabilities = result.get("all_probabilities", {})
+    top = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "language": result["language"],
+        "confidence": result["confidence"],
+        "probabilities": dict(top),
+        "cached": result.get("cached", False)
+    }
+
+@router.post("/stt/long", status_code=202)
+async def speech_to_text_long(audio: UploadFile = File(...),
+                              language: Optional[str] = Form(None),
+                              task: str = Form("transcribe"),
+                              model: Optional[str] = Form(None)):
+    """Start transcribing a long recording as a background job"""
+    if not stt_service:
+        raise HTTPException(status_code=503, detail="STT service not available")
+    
+    if not stt_service.is_ready:
+        raise HTTPException(status_code=503, detail="STT service not ready")
+    
+    if not audio.content_type.startswith('audio/'):
+        raise HTTPException(status_code=400, detail="File must be an audio file")
+    
+    if task not in ("transcribe", "translate"):
+        raise HTTPException(status_code=400, detail="Task must be 'transcribe' or 'translate'")
+    
+    if model and model not in stt_service.get_available_models():
+        raise HTTPException(status_code=400, detail=f"Unknown model. Available models: {stt_service.get_available_models()}")
+    
+    if not audio.size:
+        raise HTTPException(status_code=400, detail="Audio file is empty")
+    
+    # The job outlives the request's spooled upload, so it decodes its own copy on disk
+    loop = asyncio.get_event_loop()
+    audio_path = await loop.run_in_executor(None, stt_service.save_long_form_upload, audio.file)
+    job = stt_service.start_long_transcription(audio_path, language=language, task=task, model_name=model)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/v1/stt/jobs/{job.id}",
+        "events_url": f"/api/v1/stt/jobs/{job.id}/events"
+    }
+
+def _get_job(job_id: str):
+    job = stt_service.jobs.get(job_id) if stt_service else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/stt/jobs/{job_id}")
+async def get_stt_job(job_id: str):
+    """Get the progress of a transcription job, and its result once completed"""
+    return _get_job(job_id).to_dict()
+
+@router.get("/stt/jobs/{job_id}/events")
+async def stt_job_events(job_id: str):
+    """Server-sent events with the progress of a transcription job until it finishes"""
+    job = _get_job(job_id)
+    
+    async def events():
+        async for state in job.watch():
+            if state is None:
+                yield ": keepalive\n\n"
+                continue
+            event = state["status"] if job.finished else "progress"
+            yield f"event: {event}\ndata: {json.dumps(state)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/stt/models")
+async def get_stt_models():
+    """Get available Whisper models and which ones are resident"""
+    if not stt_service:
+        raise HTTPException(status_code=503, detail="STT service not available")
+    return stt_service.get_model_info()
+
 @router.post("/tts")
-async def text_to_speech(request: TTSRequest):
+async def text_to_speech(request: TTSRequest,
+                         accept: Optional[str] = Header(None),
+                         if_none_match: Optional[str] = Header(None)):
     """Convert text to speech"""
     if not tts_service:
         raise HTTPException(status_code=503, detail="TTS service not available")
@@ -87,27 +317,69 @@ async def text_to_speech(request: TTSRequest):
     if not request.text or len(request.text.strip()) == 0:
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
+    fmt = _output_format(request, accept)
+    sample_rate = request.sample_rate
+    
+    # Audio is content-addressed, so the cache key doubles as a strong ETag
+    etag = f'"{tts_service.cache_key(request.text, request.voice, fmt, sample_rate, request.bitrate)}"'
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+    
     try:
-        audio_file_path = await tts_service.synthesize_speech(request.text, request.voice)
+        audio_bytes = await tts_service.synthesize_audio(
+            request.text, request.voice, fmt, sample_rate, request.bitrate
+        )
         
-        if audio_file_path is None:
+        if audio_bytes is None:
             raise HTTPException(status_code=500, detail="Failed to synthesize speech")
         
-        if not os.path.exists(audio_file_path):
-            raise HTTPException(status_code=500, detail="Generated audio file not found")
-        
-        return FileResponse(
-            audio_file_path,
-            media_type='audio/wav',
-            filename='speech.wav'
+        return Response(
+            content=audio_bytes,
+            media_type=media_type(fmt, sample_rate or 24000),
+            headers={
+                "Content-Disposition": f'attachment; filename="speech{FORMATS[fmt][1]}"',
+                "ETag": etag,
+                "Vary": "Accept"
+            }
         )
         
     except HTTPException:
         raise
+    except OverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error in TTS endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/tts/stream")
+async def text_to_speech_stream(request: TTSRequest, accept: Optional[str] = Header(None)):
+    """Convert text to speech, streaming audio as each segment is synthesized"""
+    if not tts_service:
+        raise HTTPException(status_code=503, detail="TTS service not available")
+    
+    if not tts_service.is_ready:
+        raise HTTPException(status_code=503, detail="TTS service not ready")
+    
+    if not request.text or len(request.text.strip()) == 0:
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    
+    fmt = _output_format(request, accept, allowed=STREAMABLE_FORMATS)
+    
+    try:
+        # Once the response has started it can no longer become a 503
+        tts_service.check_capacity()
+        scheduler.check_admission()
+    except OverloadedError as e:
+        raise _overloaded(e)
+    
+    return StreamingResponse(
+        tts_service.synthesize_speech_stream(
+            request.text, request.voice, fmt, request.sample_rate, request.bitrate
+        ),
+        media_type=media_type(fmt, request.sample_rate or 24000),
+        headers={"Vary": "Accept"}
+    )
+
 @router.get("/voices")
 async def get_voices():
     """Get available TTS voices"""
@@ -115,11 +387,15 @@ async def get_voices():
         return {"voices": []}
     return {"voices": tts_service.get_available_voices()}
 
+def generate_response(message: str) -> str:
+    """Produce Valper's reply to a user message (placeholder for future LLM integration)"""
+    # This is a simple echo for now - you can integrate with an LLM later
+    return f"You said: {message}. This is Valper responding!"
+
 @router.post("/conversation")
 async def conversation(request: ConversationRequest):
     """Simple conversation endpoint (placeholder for future LLM integration)"""
-    # This is a simple echo for now - you can integrate with an LLM later
-    response_text = f"You said: {request.message}. This is Valper responding!"
+    response_text = generate_response(request.message)
     
     if not tts_service or not tts_service.is_ready:
         return {"text_response": response_text, "audio_url": None}
@@ -129,19 +405,273 @@ async def conversation(request: ConversationRequest):
         
         return {
             "text_response": response_text,
-            "audio_url": f"/api/v1/audio/{os.path.basename(audio_file_path)}"
+            "audio_url": f"/api/v1/audio/{os.path.basename(audio_file_path)}" if audio_file_path else None
         }
         
+    except OverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error in conversation endpoint: {e}")
         return {"text_response": response_text, "audio_url": None}
 
+@router.websocket("/voice")
+async def voice_round_trip(websocket: WebSocket, voice: str = 'af_heart'):
+    """Full voice round trip over one connection: speech in, reply audio out
+    
+    The client sends the recording as binary frames followed by a text frame
+    {"event": "end"}. The server replies with {"type": "transcript"} and
+    {"type": "response"} messages, then streams the reply as binary WAV
+    frames (sentence by sentence) and finishes with {"type": "done"}.
+    """
+    await websocket.accept()
+    
+    if not stt_service or not stt_service.is_ready:
+        await websocket.close(code=1013, reason="STT service not ready")
+        return
+    
+    try:
+        audio = bytearray()
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                audio.extend(message["bytes"])
+            elif message.get("text") and _is_end_event(message["text"]):
+                break
+        
+        if len(audio) == 0:
+            await websocket.send_json({"type": "error", "detail": "Audio is empty"})
+            await websocket.close()
+            return
+        
+        try:
+            result = await stt_service.transcribe_audio(bytes(audio))
+        except OverloadedError as e:
+            await websocket.send_json({"type": "error", "detail": f"{e}, try again later", "retry_after": e.retry_after})
+            await websocket.close(code=1013)
+            return
+        if not result["success"]:
+            await websocket.send_json({"type": "error", "detail": result.get("error", "Failed to transcribe audio")})
+            await websocket.close()
+            return
+        await websocket.send_json({"type": "transcript", "text": result["text"]})
+        
+        response_text = generate_response(result["text"])
+        await websocket.send_json({"type": "response", "text": response_text})
+        
+        if tts_service and tts_service.is_ready:
+            try:
+                tts_service.check_capacity()
+                scheduler.check_admission()
+                async for chunk in tts_service.synthesize_speech_stream(response_text, voice):
+                    await websocket.send_bytes(chunk)
+            except OverloadedError as e:
+                await websocket.send_json({"type": "error", "detail": f"{e}, try again later", "retry_after": e.retry_after})
+        
+        await websocket.send_json({"type": "done"})
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        logger.info("Voice client disconnected")
+    except Exception as e:
+        logger.error(f"Error in voice endpoint: {e}")
+        await websocket.close(code=1011)
+
+def _job_scheduler():
+    if not job_scheduler:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    return job_scheduler
+
+def _batch_response(batch: dict) -> dict:
+    return {
+        "batch_id": batch["batch_id"],
+        "batch_url": f"/api/v1/jobs/batches/{batch['batch_id']}",
+        "job_ids": batch["job_ids"]
+    }
+
+@router.post("/jobs/stt", status_code=202)
+async def submit_stt_jobs(audio: List[UploadFile] = File(...),
+                          language: Optional[str] = Form(None),
+                          task: str = Form("transcribe"),
+                          model: Optional[str] = Form(None)):
+    """Queue one transcription job per uploaded audio file"""
+    scheduler = _job_scheduler()
+    
+    if len(audio) > settings.JOBS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {settings.JOBS_MAX_BATCH} files per batch")
+    
+    if task not in ("transcribe", "translate"):
+        raise HTTPException(status_code=400, detail="Task must be 'transcribe' or 'translate'")
+    
+    if model and stt_service and model not in stt_service.get_available_models():
+        raise HTTPException(status_code=400, detail=f"Unknown model. Available models: {stt_service.get_available_models()}")
+    
+    items, inputs = [], []
+    for upload in audio:
+        if not (upload.content_type or "").startswith('audio/'):
+            raise HTTPException(status_code=400, detail=f"{upload.filename}: file must be an audio file")
+        if not upload.size:
+            raise HTTPException(status_code=400, detail=f"{upload.filename}: audio file is empty")
+        if settings.STT_MAX_UPLOAD_BYTES and upload.size > settings.STT_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{upload.filename}: file is larger than the {settings.STT_MAX_UPLOAD_BYTES} byte limit"
+            )
+        items.append({"filename": upload.filename, "language": language, "task": task, "model": model})
+        # Copied from the spooled upload into the queue's directory, never read into memory whole
+        inputs.append(upload.file)
+    
+    return _batch_response(await scheduler.submit("stt", items, inputs))
+
+@router.post("/jobs/tts", status_code=202)
+async def submit_tts_jobs(request: TTSJobRequest):
+    """Queue one synthesis job per item"""
+    scheduler = _job_scheduler()
+    
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to synthesize")
+    
+    if len(request.items) > settings.JOBS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {settings.JOBS_MAX_BATCH} items per batch")
+    
+    items = []
+    for item in request.items:
+        if not item.text or len(item.text.strip()) == 0:
+            raise HTTPException(status_code=400, detail="Text cannot be empty")
+        params = item.dict()
+        params["format"] = _output_format(item, None)
+        items.append(params)
+    
+    return _batch_response(await scheduler.submit("tts", items))
+
+@router.get("/jobs/batches/{batch_id}")
+async def get_job_batch(batch_id: str):
+    """Get every job of a batch with a count per status"""
+    loop = asyncio.get_event_loop()
+    jobs = await loop.run_in_executor(None, _job_scheduler().queue.get_batch, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    counts = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return {"batch_id": batch_id, "total": len(jobs), "counts": counts, "jobs": [job_to_dict(job) for job in jobs]}
+
+async def _get_queued_job(job_id: str):
+    # The queue's SQLite calls block, so they run off the event loop
+    loop = asyncio.get_event_loop()
+    job = await loop.run_in_executor(None, _job_scheduler().queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status of a queued job, with the transcript once an STT job completes"""
+    return job_to_dict(await _get_queued_job(job_id))
+
+@router.get("/jobs/{job_id}/output")
+async def get_job_output(job_id: str):
+    """Fetch a completed job's output: the transcript for STT, the audio file for TTS"""
+    job = await _get_queued_job(job_id)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    
+    if job["kind"] == "stt":
+        return json.loads(job["result"])
+    
+    result = json.loads(job["result"])
+    if not job["output_path"] or not os.path.exists(job["output_path"]):
+        raise HTTPException(status_code=404, detail="Job output not found")
+    return FileResponse(job["output_path"], media_type=result["media_type"],
+                        filename=os.path.basename(job["output_path"]))
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events on every status change of a queued job until it finishes"""
+    await _get_queued_job(job_id)
+    
+    async def events():
+        async for state in job_scheduler.watch(job_id):
+            if state is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started yet"""
+    job = await _get_queued_job(job_id)
+    loop = asyncio.get_event_loop()
+    if not await loop.run_in_executor(None, _job_scheduler().queue.cancel, job_id):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']} and can no longer be cancelled")
+    return {"job_id": job_id, "status": "cancelled"}
+
 @router.get("/audio/{filename}")
-async def get_audio(filename: str):
+async def get_audio(filename: str,
+                    range_header: Optional[str] = Header(None, alias="Range"),
+                    if_none_match: Optional[str] = Header(None)):
     """Serve generated audio files"""
-    current_dir = os.getcwd()
-    file_path = os.path.join(current_dir, 'temp', 'audio', filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path, media_type='audio/wav')
+    loop = asyncio.get_event_loop()
+    artifact = await loop.run_in_executor(None, tts_service.audio_store.get, filename) if tts_service else None
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    
+    headers = {"ETag": artifact.etag, "Accept-Ranges": "bytes"}
+    if if_none_match and artifact.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = _parse_range(range_header, artifact.size) if range_header else None
+    if byte_range is not None:
+        start, end = byte_range
+        try:
+            content = await loop.run_in_executor(None, _read_range, artifact.path, start, end)
+        except OSError:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        headers["Content-Range"] = f"bytes {start}-{end}/{artifact.size}"
+        return Response(content=content, status_code=206, media_type=artifact.media_type, headers=headers)
+    
+    return FileResponse(artifact.path, media_type=artifact.media_type, headers=headers)
+
+def _read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """Parse a single "bytes=start-end" range into inclusive offsets
+    
+    Returns None if the header should be ignored and the whole file served:
+    other units, several ranges, or a range that is not valid syntax (RFC
+    7233 section 3.1). Raises a 416 if the range is valid but lies outside
+    the file.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    if not (start_text.isdigit() or start_text == "") or not (end_text.isdigit() or end_text == ""):
+        return None
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if end_text and start > end:
+            return None
+    elif end_text:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(end_text))
+        end = size - 1 if int(end_text) else -1
     else:
-        raise HTTPException(status_code=404, detail="Audio file not found") 
\ No newline at end of file
+        return None
+    end = min(end, size - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
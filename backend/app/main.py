@@ -1,9 +1,16 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from app.services.stt_service import STTService
 from app.services.tts_service import TTSService
+from app.services.job_queue import JobQueue, JobScheduler
+from app.services import workers
+from app.services.fair_scheduler import ClientRateLimiter, scheduler
+from config import settings
+from app.services.metrics import metrics
+from app.api.middleware import MetricsMiddleware, RateLimitMiddleware, UploadLimitMiddleware, REQUESTS_IN_FLIGHT
 from app.api.routes import router
+import asyncio
 import os
 import tempfile
 import logging
@@ -18,51 +25,207 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
+# Oversized uploads are refused while they stream in, before they are spooled
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/api/v1/stt": settings.STT_MAX_UPLOAD_BYTES,
+    "/api/v1/stt/detect-language": settings.STT_MAX_UPLOAD_BYTES,
+    "/api/v1/stt/long": settings.STT_LONG_FORM_MAX_UPLOAD_BYTES,
+    "/api/v1/jobs/stt": settings.JOBS_MAX_UPLOAD_BYTES,
+})
+
+# Per-client token buckets, checked before any of the body is read. Each
+# forked worker enforces its share of the limit
+rate_limiter = None
+if settings.RATE_LIMIT_ENABLED:
+    workers_count = max(1, settings.WORKERS)
+    rate_limiter = ClientRateLimiter(
+        settings.RATE_LIMIT_REQUESTS_PER_SECOND / workers_count,
+        settings.RATE_LIMIT_BURST / workers_count,
+        max_clients=settings.RATE_LIMIT_MAX_CLIENTS
+    )
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter,
+                       exempt=["/", "/metrics", "/api/v1/health", "/api/v1/ready"],
+                       api_keys=settings.RATE_LIMIT_API_KEYS)
+
+# Request latency, in-flight and bytes in/out metrics
+app.add_middleware(MetricsMiddleware)
+
+# CORS middleware, added last so it is outermost and also sets its headers
+# on the 413 and 429 responses of the middleware above
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for external access
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 # Initialize services as global instances
 stt_service = STTService()
 tts_service = TTSService()
+job_scheduler = JobScheduler(
+    JobQueue(settings.JOBS_DIR, max_attempts=settings.JOBS_MAX_ATTEMPTS),
+    stt_service, tts_service,
+    stt_concurrency=settings.JOBS_STT_CONCURRENCY,
+    tts_concurrency=settings.JOBS_TTS_CONCURRENCY,
+    retention_seconds=settings.JOBS_RETENTION_SECONDS,
+    # Jobs may run in a sibling worker process, which can't notify this one
+    poll_seconds=1.0 if settings.WORKERS > 1 else None
+)
+heartbeat = None
+model_loading = None
 
 # Share services with router
 from app.api import routes
 routes.stt_service = stt_service
 routes.tts_service = tts_service
+routes.job_scheduler = job_scheduler
+routes.rate_limiter = rate_limiter
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    logger.info("Starting Valper AI Assistant...")
+# Mirror service-owned counters and queue state into the metrics registry at scrape time
+TTS_QUEUE = metrics.gauge("valper_tts_queue", "TTS worker pool occupancy", labels=("state",))
+TTS_CACHE = metrics.counter("valper_tts_cache_lookups_total", "TTS cache lookups by result", labels=("result",))
+TTS_CACHE_BYTES = metrics.gauge("valper_tts_cache_bytes", "TTS cache size", labels=("tier",))
+STT_RESULT_CACHE = metrics.counter("valper_stt_result_cache_lookups_total", "STT result cache lookups by result", labels=("result",))
+STT_RESULT_CACHE_BYTES = metrics.gauge("valper_stt_result_cache_bytes", "STT result cache size", labels=("tier",))
+STT_BATCHES = metrics.counter("valper_stt_batches_total", "Batched Whisper decoder passes")
+STT_BATCH_ITEMS = metrics.counter("valper_stt_batch_items_total", "Clips transcribed through batching")
+STT_BATCH_QUEUE = metrics.gauge("valper_stt_batch_queue", "Clips waiting for the next Whisper batch")
+STT_MODEL_BYTES = metrics.gauge("valper_stt_model_bytes", "Resident Whisper model size", labels=("model",))
+STT_MODEL_IN_USE = metrics.gauge("valper_stt_model_in_use", "In-flight requests per Whisper model", labels=("model",))
+AUDIO_STORE_BYTES = metrics.gauge("valper_audio_store_bytes", "Disk used by generated audio files")
+JOBS = metrics.gauge("valper_jobs", "Queued batch jobs by kind and status", labels=("kind", "status"))
+
+def collect_service_metrics():
+    queue = tts_service.get_queue_stats()
+    TTS_QUEUE.set(queue["in_flight"], state="in_flight")
+    TTS_QUEUE.set(queue["queue_depth"], state="queued")
+    
+    if tts_service.cache:
+        cache = tts_service.cache.stats()
+        TTS_CACHE.set(cache["memory_hits"], result="memory_hit")
+        TTS_CACHE.set(cache["disk_hits"], result="disk_hit")
+        TTS_CACHE.set(cache["misses"], result="miss")
+        TTS_CACHE_BYTES.set(cache["memory_bytes"], tier="memory")
+        TTS_CACHE_BYTES.set(cache["disk_bytes"], tier="disk")
+    
+    if stt_service.result_cache:
+        cache = stt_service.result_cache.stats()
+        STT_RESULT_CACHE.set(cache["memory_hits"], result="memory_hit")
+        STT_RESULT_CACHE.set(cache["disk_hits"], result="disk_hit")
+        STT_RESULT_CACHE.set(cache["misses"], result="miss")
+        STT_RESULT_CACHE_BYTES.set(cache["memory_bytes"], tier="memory")
+        if cache["disk_bytes"] is not None:
+            STT_RESULT_CACHE_BYTES.set(cache["disk_bytes"], tier="disk")
+    
+    if stt_service.batcher:
+        batching = stt_service.batcher.get_stats()
+        STT_BATCHES.set(batching["batches_run"])
+        STT_BATCH_ITEMS.set(batching["items_run"])
+        STT_BATCH_QUEUE.set(batching["queued"])
     
-    # Initialize STT service
+    for name, model in stt_service.registry.get_stats()["models"].items():
+        STT_MODEL_BYTES.set(model["size_bytes"], model=name)
+        STT_MODEL_IN_USE.set(model["in_use"], model=name)
+    
+    AUDIO_STORE_BYTES.set(tts_service.audio_store.get_stats()["total_bytes"])
+    
+    for kind, statuses in job_scheduler.queue.get_stats().items():
+        for status, count in statuses.items():
+            JOBS.set(count, kind=kind, status=status)
+
+metrics.add_collector(collect_service_metrics)
+
+async def _load_stt():
     try:
         await stt_service.initialize()
         logger.info("STT service initialized successfully!")
     except Exception as e:
         logger.error(f"Failed to initialize STT service: {e}")
         # Don't raise the exception, let the service start with STT disabled
-    
-    # Initialize TTS service
+
+async def _load_tts():
     try:
         await tts_service.initialize()
         logger.info("TTS service initialized successfully!")
     except Exception as e:
         logger.error(f"Failed to initialize TTS service: {e}")
         # Don't raise the exception, let the service start with TTS disabled
+
+async def load_models():
+    """Load the Whisper and Kokoro models side by side; a service that fails to load stays disabled"""
+    await asyncio.gather(_load_stt(), _load_tts())
+
+def reset_after_fork(threads: int):
+    """Prepare a server worker forked after load_models() ran in its parent (see app.server)"""
+    stt_service.reset_after_fork(threads)
+    tts_service.reset_after_fork()
+    scheduler.reset_after_fork()
+    job_scheduler.queue.reopen()
+
+def worker_status() -> dict:
+    """State this worker publishes for the per-worker health report"""
+    return {
+        "stt_ready": stt_service.is_ready,
+        "tts_ready": tts_service.is_ready,
+        "requests_in_flight": REQUESTS_IN_FLIGHT.get(),
+        "tts_queue": tts_service.get_queue_stats(),
+        "jobs_running": job_scheduler.get_stats()["running"]
+    }
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize services on startup"""
+    logger.info("Starting Valper AI Assistant...")
+    
+    # Models load in the background so the server answers (liveness) right
+    # away; /api/v1/ready reports when they are usable. A forked worker gets
+    # them already loaded from its parent.
+    global model_loading
+    model_loading = asyncio.ensure_future(load_models())
+    
+    # Expire generated audio, and hold the workers' shared TTS cache to its limit, in the background
+    tts_service.audio_store.start()
+    if tts_service.cache:
+        tts_service.cache.start()
+    
+    # Resume queued (and interrupted) batch jobs
+    job_scheduler.start()
+    
+    # Report this worker's state to its siblings' health checks
+    if workers.current_worker:
+        global heartbeat
+        heartbeat = workers.WorkerHeartbeat(
+            settings.WORKERS_STATE_DIR, workers.current_worker, worker_status,
+            settings.WORKER_HEARTBEAT_SECONDS
+        )
+        heartbeat.start()
     
     logger.info("Valper AI Assistant startup completed!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks on shutdown"""
+    if model_loading and not model_loading.done():
+        model_loading.cancel()
+    if heartbeat:
+        await heartbeat.stop()
+    await tts_service.audio_store.stop()
+    if tts_service.cache:
+        await tts_service.cache.stop()
+    stt_service.long_form.shutdown()
+    await job_scheduler.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Valper AI Assistant API", "version": "1.0.0"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include API routes
 app.include_router(router, prefix="/api/v1")
 
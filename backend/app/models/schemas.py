@@ -5,6 +5,9 @@ from datetime import datetime
 class TTSRequest(BaseModel):
     text: str = Field(..., description="Text to convert to speech", max_length=1000)
     voice: str = Field(default='af_heart', description="Voice to use for synthesis")
+    format: Optional[str] = Field(default=None, description="Output format: wav, pcm, flac, ogg (Opus) or mp3")
+    sample_rate: Optional[int] = Field(default=None, description="Output sample rate in Hz (8000-48000)")
+    bitrate: Optional[str] = Field(default=None, description="Target bitrate for ogg/mp3, e.g. '32k'")
 
 class TTSResponse(BaseModel):
     audio_url: str
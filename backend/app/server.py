@@ -0,0 +1,159 @@
+"""Run the API, optionally as several worker processes sharing one copy of the models
+
+    python -m app.server
+
+With WORKERS=1 this is plain uvicorn. With more, this process loads the
+Whisper and Kokoro models once, then forks the workers, which all accept
+connections on the same listening socket. Forked workers share the
+parent's memory copy-on-write, and the weights are never written to, so
+they stay shared: memory grows with per-request buffers, not with the
+worker count. A worker that exits unexpectedly is forked again from the
+same loaded parent.
+"""
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+import uvicorn
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app_main, sock: socket.socket, index: int, restarts: int, threads: int):
+    """Body of a forked worker process; never returns"""
+    from app.services import workers
+    
+    # Signal handling is uvicorn's job in the worker
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    
+    workers.current_worker = {
+        "index": index,
+        "pid": os.getpid(),
+        "restarts": restarts,
+        "started_at": time.time()
+    }
+    status = 0
+    try:
+        app_main.reset_after_fork(threads)
+        config = uvicorn.Config(app_main.app, log_level=settings.LOG_LEVEL.lower())
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        logger.error(f"Worker {index} failed: {e}")
+        status = 1
+    finally:
+        os._exit(status)
+
+class Supervisor:
+    """Forks the workers and keeps ``count`` of them running until stopped"""
+    
+    def __init__(self, app_main, sock: socket.socket, count: int):
+        self.app_main = app_main
+        self.sock = sock
+        self.count = count
+        # Split the cores between workers unless the thread count is pinned
+        self.threads = settings.STT_INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // count)
+        self.children = {}  # pid -> worker index
+        self.restarts = [0] * count
+        self.stopping = False
+    
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.app_main, self.sock, index, self.restarts[index], self.threads)
+        self.children[pid] = index
+        logger.info(f"Started worker {index} (pid {pid})")
+    
+    def signal_children(self, signum: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    def stop(self, signum, _frame):
+        if not self.stopping:
+            logger.info(f"Received signal {signum}, stopping workers")
+        self.stopping = True
+        self.signal_children(signal.SIGTERM)
+    
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        
+        # The job queue's connection must not be carried across fork
+        queue = self.app_main.job_scheduler.queue
+        queue.close()
+        for index in range(self.count):
+            self.spawn(index)
+        queue.reopen()
+        
+        deadline = None
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and deadline is None:
+                    deadline = time.monotonic() + 30
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.warning("Workers did not stop in time, killing them")
+                    self.signal_children(signal.SIGKILL)
+                    deadline = float("inf")
+                time.sleep(0.2)
+                continue
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            
+            logger.error(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting it")
+            # Jobs it was running go back to the queue for the other workers
+            queue.recover(owner=pid)
+            self.restarts[index] += 1
+            # Don't spin if a worker keeps dying at startup
+            time.sleep(min(8.0, 0.5 * 2 ** self.restarts[index]))
+            if not self.stopping:
+                self.spawn(index)
+        queue.close()
+        logger.info("All workers stopped")
+
+def main():
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    count = settings.WORKERS
+    if count <= 1:
+        uvicorn.run("app.main:app", host=settings.API_HOST, port=settings.API_PORT,
+                    log_level=settings.LOG_LEVEL.lower())
+        return
+    
+    from app import main as app_main
+    from app.services.whisper_backends import configure_threads
+    from app.services.workers import clear_workers
+    
+    # Load with a single torch thread: forking after torch's thread pool has
+    # started can deadlock the children. Each worker sizes its own pool.
+    configure_threads(1, settings.STT_INTER_OP_THREADS)
+    logger.info(f"Loading models once for {count} workers...")
+    asyncio.run(app_main.load_models())
+    
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers don't write to (and unshare) those pages
+    gc.collect()
+    gc.freeze()
+    
+    clear_workers(settings.WORKERS_STATE_DIR)
+    sock = _bind_socket(settings.API_HOST, settings.API_PORT)
+    logger.info(f"Listening on {settings.API_HOST}:{settings.API_PORT} with {count} workers")
+    Supervisor(app_main, sock, count).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import io
+import logging
+import math
+import subprocess
+from typing import BinaryIO, Optional, Union
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# An uploaded file, either in memory or as a seekable file object (such as
+# the spooled temporary file behind a FastAPI UploadFile)
+AudioSource = Union[bytes, BinaryIO]
+
+class AudioTooLongError(ValueError):
+    """Raised when audio is longer than the caller's duration limit"""
+    
+    def __init__(self, limit_seconds: float):
+        self.limit_seconds = limit_seconds
+        super().__init__(f"Audio is longer than the {limit_seconds:g} second limit")
+
+# Whisper expects 16kHz mono float32
+WHISPER_SAMPLE_RATE = 16000
+# Samples in one 30 second Whisper window (whisper.audio.N_SAMPLES)
+WHISPER_WINDOW_SAMPLES = 30 * WHISPER_SAMPLE_RATE
+
+def decode_audio(audio_data: AudioSource, sample_rate: int = WHISPER_SAMPLE_RATE,
+                 max_seconds: Optional[float] = None,
+                 duration_limit: Optional[float] = None) -> np.ndarray:
+    """Decode an uploaded audio file into a mono float32 array at the given rate
+    
+    WAV, FLAC and OGG are decoded with soundfile straight from the bytes or
+    file object. Anything libsndfile can't read (WebM, MP3 on older builds,
+    M4A, ...) is streamed through ffmpeg over stdin/stdout, so no copy of
+    the upload is made either way. With ``max_seconds`` only the start of
+    the file is decoded; audio longer than ``duration_limit`` raises
+    AudioTooLongError, before it is decoded when the header gives its length.
+    """
+    try:
+        with sf.SoundFile(_as_file(audio_data)) as f:
+            source_rate = f.samplerate
+            if duration_limit and f.frames > duration_limit * source_rate:
+                raise AudioTooLongError(duration_limit)
+            frames = int(max_seconds * source_rate) if max_seconds else -1
+            audio = f.read(frames, dtype='float32', always_2d=True)
+    except (RuntimeError, sf.SoundFileError) as e:
+        logger.debug(f"soundfile could not decode upload ({e}), falling back to ffmpeg")
+        return _decode_with_ffmpeg(audio_data, sample_rate, max_seconds, duration_limit)
+    
+    # Downmix to mono
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    
+    if source_rate != sample_rate:
+        audio = resample(audio, source_rate, sample_rate)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def resample(audio: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Resample a mono float32 signal"""
+    import librosa
+    return librosa.resample(audio, orig_sr=source_rate, target_sr=target_rate).astype(np.float32)
+
+class StreamingResampler:
+    """Resample a mono float32 signal that arrives in chunks
+    
+    Each output sample is interpolated with a windowed sinc filter over the
+    input around it, keeping the input still needed for the next chunk, so
+    the result is one continuous signal instead of separately resampled
+    pieces with their edges filtered against silence. Output lags the
+    input by ``half_width`` input samples until flush() is called.
+    """
+    
+    def __init__(self, source_rate: int, target_rate: int, half_width: int = 16):
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        # Below 1 when downsampling, to filter out what the new rate can't hold
+        self.cutoff = min(1.0, target_rate / source_rate)
+        self.half_width = int(np.ceil(half_width / self.cutoff))
+        self._taps = np.arange(-self.half_width + 1, self.half_width + 1)
+        # Filter weights depend only on where an output sample falls between
+        # two input samples, which repeats every target / gcd outputs
+        self._phases = target_rate // math.gcd(source_rate, target_rate)
+        fraction = (np.arange(self._phases) * source_rate % target_rate) / target_rate
+        distance = fraction[:, None] - self._taps[None, :]
+        window = 0.5 + 0.5 * np.cos(np.pi * distance / (self.half_width + 1))
+        weights = np.sinc(distance * self.cutoff) * window
+        self._weights = (weights / weights.sum(axis=1, keepdims=True)).astype(np.float32)
+        # Input before the stream starts is silence
+        self._buffer = np.zeros(self.half_width, dtype=np.float32)
+        self._offset = -self.half_width
+        self._next = 0
+    
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Add a chunk of input and return the output that is now complete"""
+        self._buffer = np.concatenate([self._buffer, np.asarray(audio, dtype=np.float32)])
+        available = self._offset + len(self._buffer)
+        # Output sample n sits at input position n * source / target and
+        # needs the input up to half_width samples past it
+        end = ((available - self.half_width) * self.target_rate - 1) // self.source_rate + 1
+        if end <= self._next:
+            return np.zeros(0, dtype=np.float32)
+        
+        n = np.arange(self._next, end, dtype=np.int64)
+        base = (n * self.source_rate) // self.target_rate
+        index = base[:, None] - self._offset + self._taps[None, :]
+        output = np.einsum("ij,ij->i", self._buffer[index], self._weights[n % self._phases])
+        
+        self._next = end
+        keep_from = (end * self.source_rate) // self.target_rate - self.half_width + 1
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return output.astype(np.float32)
+    
+    def flush(self) -> np.ndarray:
+        """Return the rest of the output, as if the input were followed by silence"""
+        total = self._offset + len(self._buffer)
+        output = self.process(np.zeros(self.half_width, dtype=np.float32))
+        expected = -(-total * self.target_rate // self.source_rate)
+        return output[:max(0, expected - (self._next - len(output)))]
+
+def _as_file(audio_data: AudioSource) -> BinaryIO:
+    if isinstance(audio_data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(audio_data)
+    audio_data.seek(0)
+    return audio_data
+
+def _ffmpeg_input(audio_data: AudioSource) -> dict:
+    """subprocess arguments feeding the upload to ffmpeg's stdin, from its file descriptor when it has one"""
+    if isinstance(audio_data, (bytes, bytearray, memoryview)):
+        return {"input": audio_data}
+    try:
+        # A spooled upload still in memory is moved to its temporary file here
+        audio_data.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        audio_data.seek(0)
+        return {"input": audio_data.read()}
+    audio_data.seek(0)
+    return {"stdin": audio_data}
+
+def _decode_with_ffmpeg(audio_data: AudioSource, sample_rate: int, max_seconds: Optional[float] = None,
+                        duration_limit: Optional[float] = None) -> np.ndarray:
+    """Decode arbitrary formats by streaming the upload through ffmpeg"""
+    # Decoding stops just past the limit, so an over-long upload is never fully decoded
+    seconds = max_seconds
+    if duration_limit and not (max_seconds and max_seconds <= duration_limit):
+        seconds = duration_limit + 1.0 / sample_rate
+    cmd = ["ffmpeg", "-threads", "0", "-i", "pipe:0"]
+    if seconds:
+        cmd += ["-t", str(seconds)]
+    cmd += ["-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True, **_ffmpeg_input(audio_data)).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    
+    if duration_limit and len(out) // 2 > duration_limit * sample_rate:
+        raise AudioTooLongError(duration_limit)
+    audio = np.frombuffer(out, np.int16).astype(np.float32)
+    audio *= 1.0 / 32768.0
+    return audio
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import logging
+import struct
+import subprocess
+from typing import AsyncGenerator, AsyncIterator, Optional
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Output formats: name -> (media type, file suffix)
+FORMATS = {
+    "wav": ("audio/wav", ".wav"),
+    "pcm": ("audio/L16", ".pcm"),
+    "flac": ("audio/flac", ".flac"),
+    "ogg": ("audio/ogg", ".ogg"),  # Opus in an Ogg container
+    "mp3": ("audio/mpeg", ".mp3"),
+}
+
+# Formats that can be produced incrementally while audio is still being synthesized
+STREAMABLE_FORMATS = ("wav", "pcm", "ogg", "mp3")
+
+DEFAULT_BITRATES = {"ogg": "32k", "mp3": "64k"}
+
+_ACCEPT_TYPES = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/l16": "pcm",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+}
+
+def media_type(fmt: str, sample_rate: int) -> str:
+    """Get the Content-Type for an output format"""
+    if fmt == "pcm":
+        return f"audio/L16;rate={sample_rate};channels=1"
+    return FORMATS[fmt][0]
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Pick the output format preferred by an Accept header, if it names one we support"""
+    if not accept:
+        return None
+    
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        fmt = _ACCEPT_TYPES.get(parts[0].lower())
+        if fmt and quality > 0:
+            candidates.append((-quality, position, fmt))
+    
+    return min(candidates)[2] if candidates else None
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """Build a WAV header for a stream of unknown length
+    
+    The RIFF and data chunk sizes are set to 0xFFFFFFFF, which browsers and
+    most decoders treat as "read until the connection closes".
+    """
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+def pcm16_bytes(audio: np.ndarray) -> bytes:
+    """Convert a float waveform in [-1, 1] to 16-bit little-endian PCM"""
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+def encode_wav(audio: np.ndarray, sample_rate: int) -> bytes:
+    """Encode a float waveform as a 16-bit PCM WAV entirely in memory"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+def encode_audio(audio: np.ndarray, sample_rate: int, fmt: str = "wav",
+                 bitrate: Optional[str] = None) -> bytes:
+    """Encode a mono float waveform in memory
+    
+    WAV, raw PCM and FLAC are written with soundfile; Opus and MP3 are
+    encoded by piping PCM through ffmpeg, which lets the bitrate be set.
+    """
+    if fmt == "wav":
+        return encode_wav(audio, sample_rate)
+    if fmt == "pcm":
+        return pcm16_bytes(audio)
+    if fmt == "flac":
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, sample_rate, format='FLAC', subtype='PCM_16')
+        return buffer.getvalue()
+    if fmt in ("ogg", "mp3"):
+        cmd = _ffmpeg_encode_cmd(fmt, sample_rate, bitrate)
+        try:
+            return subprocess.run(cmd, input=pcm16_bytes(audio), capture_output=True, check=True).stdout
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to encode {fmt}: {e.stderr.decode(errors='ignore')}") from e
+    raise ValueError(f"Unsupported audio format: {fmt}")
+
+def _ffmpeg_encode_cmd(fmt: str, sample_rate: int, bitrate: Optional[str], streaming: bool = False) -> list:
+    cmd = [
+        "ffmpeg", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+        "-b:a", bitrate or DEFAULT_BITRATES[fmt],
+    ]
+    if fmt == "ogg":
+        cmd += ["-c:a", "libopus", "-f", "ogg"]
+        if streaming:
+            # Short Ogg pages so the client can start decoding right away
+            cmd += ["-page_duration", "20000"]
+    else:
+        cmd += ["-c:a", "libmp3lame", "-f", "mp3"]
+    if streaming:
+        cmd += ["-flush_packets", "1"]
+    return cmd + ["pipe:1"]
+
+async def transcode_stream(pcm_chunks: AsyncIterator[bytes], sample_rate: int, fmt: str,
+                           bitrate: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+    """Encode a stream of 16-bit PCM chunks to Opus/MP3 with ffmpeg, yielding output as it is produced"""
+    process = await asyncio.create_subprocess_exec(
+        *_ffmpeg_encode_cmd(fmt, sample_rate, bitrate, streaming=True),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    
+    async def feed():
+        try:
+            async for chunk in pcm_chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+    
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            data = await process.stdout.read(4096)
+            if not data:
+                break
+            yield data
+        await feeder
+    finally:
+        feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from app.services.audio_encoding import FORMATS
+
+logger = logging.getLogger(__name__)
+
+_MEDIA_TYPES = {suffix: media_type for media_type, suffix in FORMATS.values()}
+
+def _etag(stat: os.stat_result) -> str:
+    """Validator from a file's size and modification time, the same in every worker process"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+class AudioArtifact:
+    """A generated audio file tracked by the AudioArtifactStore"""
+    
+    def __init__(self, filename: str, path: str, size: int, etag: str,
+                 media_type: str, created_at: float, expires_at: float):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.media_type = media_type
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+class AudioArtifactStore:
+    """Bounded store for generated audio files
+    
+    Every artifact is indexed in memory when it is written, so lookups never
+    touch the filesystem. Artifacts expire after ``ttl_seconds``. When the
+    total size goes over ``max_bytes``, the oldest ones are deleted first. A
+    background sweeper removes expired files, and any files left over from
+    a previous run are cleared at startup.
+    
+    With ``shared`` set, several worker processes write to the same
+    directory, each with its own index; a lookup that misses the index then
+    falls back to the directory, so a file can be fetched from any worker.
+    The sweeper then also goes through the whole directory by modification
+    time, removing expired files and the oldest ones past
+    ``shared_max_bytes``, so files of a worker that died are not kept
+    forever and count towards the quota.
+    """
+    
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int,
+                 sweep_interval_seconds: float = 60.0, shared: bool = False,
+                 shared_max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.shared = shared
+        self.shared_max_bytes = shared_max_bytes if shared_max_bytes is not None else max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+        
+        self._artifacts: "OrderedDict[str, AudioArtifact]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.evicted = 0
+        
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_orphans()
+    
+    def _remove_orphans(self):
+        """Delete audio files that are not in the index, e.g. from before a restart"""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and name.endswith(('.wav', '.pcm', '.ogg', '.flac', '.mp3')):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+    
+    def put(self, data: bytes, suffix: str = '.wav', media_type: str = 'audio/wav') -> AudioArtifact:
+        """Write audio bytes to disk and index them"""
+        filename = f"{uuid.uuid4().hex}{suffix}"
+        path = os.path.join(self.directory, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        stat = os.stat(path)
+        
+        now = time.time()
+        artifact = AudioArtifact(
+            filename=filename,
+            path=path,
+            size=len(data),
+            etag=_etag(stat),
+            media_type=media_type,
+            created_at=now,
+            expires_at=now + self.ttl_seconds
+        )
+        with self._lock:
+            self._artifacts[filename] = artifact
+            self._total_bytes += artifact.size
+            evicted = self._evict_over_quota()
+        self._delete_files(evicted)
+        return artifact
+    
+    def get(self, filename: str) -> Optional[AudioArtifact]:
+        """Look up a live artifact by filename
+        
+        In shared mode this may stat the file, so call it off the event loop.
+        """
+        with self._lock:
+            artifact = self._artifacts.get(filename)
+        if self.shared:
+            # Another worker's sweep may have removed an indexed file
+            if artifact is not None and not os.path.exists(artifact.path):
+                self._forget([filename])
+                return None
+            if artifact is None:
+                artifact = self._find_on_disk(filename)
+        if artifact is None or artifact.expires_at <= time.time():
+            return None
+        return artifact
+    
+    def _find_on_disk(self, filename: str) -> Optional[AudioArtifact]:
+        """Build an artifact for a file written by another worker process"""
+        suffix = os.path.splitext(filename)[1]
+        if os.path.basename(filename) != filename or suffix not in _MEDIA_TYPES:
+            return None
+        path = os.path.join(self.directory, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return AudioArtifact(
+            filename=filename,
+            path=path,
+            size=stat.st_size,
+            etag=_etag(stat),
+            media_type=_MEDIA_TYPES[suffix],
+            created_at=stat.st_mtime,
+            expires_at=stat.st_mtime + self.ttl_seconds
+        )
+    
+    def _evict_over_quota(self) -> list:
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._artifacts) > 1:
+            _, artifact = self._artifacts.popitem(last=False)
+            self._total_bytes -= artifact.size
+            self.evicted += 1
+            evicted.append(artifact)
+        return evicted
+    
+    def sweep(self) -> int:
+        """Remove expired artifacts; returns how many were removed"""
+        removed = self._sweep_index()
+        if self.shared:
+            removed += self._sweep_directory()
+        return removed
+    
+    def _sweep_index(self) -> int:
+        now = time.time()
+        expired = []
+        with self._lock:
+            # Insertion order is creation order, and every artifact has the same TTL
+            while self._artifacts:
+                artifact = next(iter(self._artifacts.values()))
+                if artifact.expires_at > now:
+                    break
+                self._artifacts.popitem(last=False)
+                self._total_bytes -= artifact.size
+                expired.append(artifact)
+            self.expired += len(expired)
+        self._delete_files(expired)
+        return len(expired)
+    
+    def _sweep_directory(self) -> int:
+        """Remove expired files of every worker, then the oldest past the shared quota"""
+        files = []
+        for name in os.listdir(self.directory):
+            if os.path.splitext(name)[1] not in _MEDIA_TYPES:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+        files.sort()
+        
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = []
+        expired = 0
+        for mtime, size, name in files:
+            is_expired = mtime + self.ttl_seconds <= now
+            if not is_expired and total <= self.shared_max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            expired += is_expired
+            removed.append(name)
+        
+        self._forget(removed)
+        with self._lock:
+            self.expired += expired
+            self.evicted += len(removed) - expired
+        return len(removed)
+    
+    def _forget(self, filenames: list):
+        """Drop files that are already gone from the index"""
+        with self._lock:
+            for filename in filenames:
+                artifact = self._artifacts.pop(filename, None)
+                if artifact is not None:
+                    self._total_bytes -= artifact.size
+    
+    @staticmethod
+    def _delete_files(artifacts: list):
+        for artifact in artifacts:
+            try:
+                os.unlink(artifact.path)
+            except OSError:
+                pass
+    
+    async def _sweep_forever(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                removed = await loop.run_in_executor(None, self.sweep)
+                if removed:
+                    logger.info(f"Swept {removed} expired audio files")
+            except Exception as e:
+                logger.error(f"Error sweeping audio files: {e}")
+    
+    def start(self):
+        """Start the background sweeper on the running event loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.ensure_future(self._sweep_forever())
+    
+    async def stop(self):
+        """Stop the background sweeper"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+    
+    def get_stats(self) -> dict:
+        """Get artifact counts and disk usage"""
+        with self._lock:
+            return {
+                "artifacts": len(self._artifacts),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
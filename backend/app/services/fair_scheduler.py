@@ -0,0 +1,283 @@
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Collection, Dict, List, Optional, Tuple
+from config import settings
+from app.services.metrics import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+# Interactive requests are always admitted before batch work
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# Used to estimate the cost of synthesis as seconds of speech
+SPEECH_CHARS_PER_SECOND = 15.0
+
+CLIENT_REQUESTS = metrics.counter(
+    "valper_client_requests_total",
+    "Requests per client, by whether the rate limit admitted them",
+    labels=("client", "outcome")
+)
+CLIENT_COST = metrics.counter(
+    "valper_client_audio_seconds_total",
+    "Estimated work per client, in seconds of audio transcribed or synthesized",
+    labels=("client", "service")
+)
+CLIENT_MODEL_SECONDS = metrics.counter(
+    "valper_client_model_seconds_total",
+    "Time each client's requests held a model slot",
+    labels=("client", "service")
+)
+CLIENT_WAIT_SECONDS = metrics.counter(
+    "valper_client_queue_wait_seconds_total",
+    "Time each client's requests waited for a model slot",
+    labels=("client", "lane")
+)
+SCHEDULER_QUEUED = metrics.gauge("valper_scheduler_queued", "Requests waiting for a model slot", labels=("lane",))
+SCHEDULER_REJECTED = metrics.counter(
+    "valper_scheduler_rejected_total",
+    "Requests refused because too many were already waiting for a model slot",
+    labels=("lane",)
+)
+SCHEDULER_IN_USE = metrics.gauge("valper_scheduler_in_use", "Model slots in use")
+
+# Who the current request is for, and its lane; set by the rate limit
+# middleware and by the job scheduler
+_client: contextvars.ContextVar = contextvars.ContextVar("client", default="internal")
+_lane: contextvars.ContextVar = contextvars.ContextVar("lane", default=INTERACTIVE)
+
+class OverloadedError(Exception):
+    """Raised when work cannot be admitted now; clients should retry after ``retry_after`` seconds"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def client_id(api_key: Optional[str], host: Optional[str], api_keys: Collection[str] = ()) -> str:
+    """Identify a client by API key, or by address when it sends no known key
+    
+    Only keys in ``api_keys`` are honoured: otherwise a client could get a
+    fresh rate limit, and new metrics series, with every made-up key. Keys
+    are hashed so they never appear in logs or metrics labels.
+    """
+    if api_key and api_key in api_keys:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return f"ip:{host or 'unknown'}"
+
+def forget_client(client: str):
+    """Drop a client's per-client metrics series"""
+    for metric in (CLIENT_REQUESTS, CLIENT_COST, CLIENT_MODEL_SECONDS, CLIENT_WAIT_SECONDS):
+        metric.remove(client=client)
+
+def current_client() -> str:
+    return _client.get()
+
+def set_request_client(client: Optional[str] = None, lane: Optional[str] = None):
+    """Attribute model work done in the current context to a client and lane"""
+    if client:
+        _client.set(client)
+    if lane:
+        _lane.set(lane)
+
+def speech_seconds(text: str) -> float:
+    """Estimated seconds of speech in a text, the cost of synthesizing it"""
+    return len(text) / SPEECH_CHARS_PER_SECOND
+
+def retry_after_header(wait: float) -> str:
+    """Retry-After value, in whole seconds, for a rate limited request"""
+    return str(max(1, math.ceil(wait)))
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, in bursts of up to ``burst``"""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens; return 0 if they were available, else the seconds until they will be"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+class ClientRateLimiter:
+    """One token bucket per client
+    
+    Buckets of the least recently seen clients are dropped past
+    ``max_clients``, together with their metrics series, which keeps the
+    number of client labels bounded; a dropped client simply starts again
+    with a full bucket.
+    """
+    
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+    
+    def check(self, client: str) -> float:
+        """Charge one request to ``client``; return 0 to admit it, else the seconds to wait"""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_clients:
+                evicted, _ = self._buckets.popitem(last=False)
+                forget_client(evicted)
+        else:
+            self._buckets.move_to_end(client)
+        
+        wait = bucket.take()
+        CLIENT_REQUESTS.inc(client=client, outcome="limited" if wait else "admitted")
+        if wait:
+            self.limited += 1
+        return wait
+    
+    def get_stats(self) -> dict:
+        return {
+            "requests_per_second": self.rate,
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            "limited": self.limited
+        }
+
+class FairScheduler:
+    """Admits model work from STT and TTS requests into a fixed number of slots
+    
+    When all slots are busy, waiting requests are queued in two lanes and
+    every interactive request is admitted before any batch one. Within a
+    lane, requests are ordered by start-time fair queuing: each gets a tag
+    of max(lane clock, client's previous tag) and the client's tag then
+    moves on by the request's cost (estimated seconds of audio). A client
+    that has just been given long jobs therefore waits behind the short
+    requests of everyone else, while an idle client is served at once.
+    
+    A lane with a ``max_queue`` limit refuses new requests with
+    OverloadedError once that many are waiting, instead of queueing
+    without bound.
+    """
+    
+    def __init__(self, capacity: int, max_queue: Optional[Dict[str, int]] = None, retry_after: int = 2):
+        self.capacity = max(1, capacity)
+        self.max_queue = {lane: max(0, limit) for lane, limit in (max_queue or {}).items()}
+        self.retry_after = retry_after
+        self.in_use = 0
+        self._queues: Dict[str, List[Tuple[float, int, asyncio.Future]]] = {lane: [] for lane in LANES}
+        self._clock: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self._finish: Dict[Tuple[str, str], float] = {}
+        self._sequence = itertools.count()
+    
+    def _tag(self, lane: str, client: str, cost: float) -> float:
+        key = (lane, client)
+        start = max(self._clock[lane], self._finish.get(key, 0.0))
+        self._finish[key] = start + max(cost, 0.0)
+        if len(self._finish) > 4096:
+            # Forget clients that are not ahead of the clock; they would start from it anyway
+            self._finish = {k: v for k, v in self._finish.items() if v > self._clock[k[0]]}
+        return start
+    
+    def check_admission(self, lane: Optional[str] = None):
+        """Raise OverloadedError if a request in the lane would have to wait and its queue is full
+        
+        Called by slot(), and by callers before costly preparation (such as
+        decoding an upload) that would be wasted on a refused request.
+        """
+        lane = lane or _lane.get()
+        limit = self.max_queue.get(lane)
+        if not limit or self.in_use < self.capacity:
+            return
+        waiting = sum(1 for _, _, future in self._queues[lane] if not future.done())
+        if waiting >= limit:
+            SCHEDULER_REJECTED.inc(lane=lane)
+            raise OverloadedError("Too many requests waiting for a model slot", self.retry_after)
+    
+    @asynccontextmanager
+    async def slot(self, service: str, cost: float, lane: Optional[str] = None):
+        """Hold a model slot for the current client while the block runs
+        
+        Raises:
+            OverloadedError: If the lane's queue is full
+        """
+        client = _client.get()
+        lane = lane or _lane.get()
+        self.check_admission(lane)
+        CLIENT_COST.inc(cost, client=client, service=service)
+        tag = self._tag(lane, client, cost)
+        
+        start = time.perf_counter()
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._queues[lane], (tag, next(self._sequence), future))
+        SCHEDULER_QUEUED.inc(lane=lane)
+        self._dispatch()
+        if not future.done():
+            try:
+                with timed(service, "queue"):
+                    await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as the request went away
+                    self._release()
+                raise
+        CLIENT_WAIT_SECONDS.inc(time.perf_counter() - start, client=client, lane=lane)
+        
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            CLIENT_MODEL_SECONDS.inc(time.perf_counter() - start, client=client, service=service)
+            self._release()
+    
+    def _release(self):
+        self.in_use -= 1
+        SCHEDULER_IN_USE.set(self.in_use)
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Hand free slots to the waiting requests first in line"""
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self.in_use < self.capacity:
+                tag, _, future = heapq.heappop(queue)
+                SCHEDULER_QUEUED.dec(lane=lane)
+                if future.done():
+                    # Cancelled while waiting
+                    continue
+                self.in_use += 1
+                self._clock[lane] = max(self._clock[lane], tag)
+                future.set_result(None)
+        SCHEDULER_IN_USE.set(self.in_use)
+    
+    def reset_after_fork(self):
+        """Drop waiters bound to the parent's event loop"""
+        self.in_use = 0
+        self._queues = {lane: [] for lane in LANES}
+    
+    def get_stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": {lane: len(queue) for lane, queue in self._queues.items()},
+            "max_queue": self.max_queue
+        }
+
+# Shared by STT and TTS so both compete for the same slots
+scheduler = FairScheduler(
+    settings.SCHEDULER_CONCURRENCY,
+    max_queue={INTERACTIVE: settings.SCHEDULER_MAX_QUEUE, BATCH: settings.SCHEDULER_MAX_BATCH_QUEUE},
+    retry_after=settings.SCHEDULER_RETRY_AFTER_SECONDS
+)
@@ -0,0 +1,453 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncGenerator, BinaryIO, Dict, List, Optional, Union
+from app.services.audio_encoding import FORMATS, media_type
+from app.services.fair_scheduler import BATCH, OverloadedError, current_client, set_request_client
+from app.services.tts_service import KOKORO_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("stt", "tts")
+
+# Statuses a job never leaves
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    input_path TEXT,
+    output_path TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (kind, status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+"""
+
+class JobQueue:
+    """SQLite-backed queue of transcription and synthesis jobs
+    
+    Job rows, uploaded inputs and synthesized outputs all live under
+    ``directory``, so queued work survives a restart. Jobs that were
+    running when the process stopped go back to the queue on startup,
+    unless they have already been tried ``max_attempts`` times.
+    
+    Several worker processes can share one queue: a claimed job records
+    the pid of the process running it, so the jobs of a single worker that
+    died can be recovered while the others keep running theirs.
+    """
+    
+    def __init__(self, directory: str, max_attempts: int = 3):
+        self.directory = directory
+        self.max_attempts = max(1, max_attempts)
+        self.inputs_dir = os.path.join(directory, "inputs")
+        self.outputs_dir = os.path.join(directory, "outputs")
+        os.makedirs(self.inputs_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        columns = [row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        if "owner" not in columns:
+            # Queues created before jobs recorded their worker
+            with self._db:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+        self.recover()
+    
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(os.path.join(self.directory, "jobs.db"), check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        # WAL without a sync per commit keeps submits cheap; the queue survives
+        # a process crash, only an OS crash can lose the last commits
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        return db
+    
+    def reopen(self):
+        """Open a new connection, e.g. in a forked worker (connections must not cross a fork)"""
+        self._lock = threading.Lock()
+        self._db = self._connect()
+    
+    def recover(self, owner: Optional[int] = None):
+        """Requeue interrupted jobs: all running jobs, or only those of the worker with pid ``owner``"""
+        where, args = ("status = 'running'", ()) if owner is None else ("status = 'running' AND owner = ?", (owner,))
+        with self._lock, self._db:
+            failed = self._db.execute(
+                f"UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', finished_at = ? "
+                f"WHERE {where} AND attempts >= ?", (time.time(), *args, self.max_attempts)
+            ).rowcount
+            requeued = self._db.execute(
+                f"UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL WHERE {where}", args
+            ).rowcount
+        if requeued or failed:
+            logger.info(f"Recovered job queue: {requeued} interrupted jobs requeued, {failed} failed")
+    
+    def submit(self, kind: str, params: dict, batch_id: str,
+               input_data: Optional[Union[bytes, BinaryIO]] = None) -> str:
+        """Queue a job; ``input_data`` (e.g. an uploaded audio file) is stored next to the database
+        
+        A file object is copied in chunks from its start.
+        """
+        job_id = uuid.uuid4().hex
+        input_path = None
+        if input_data is not None:
+            input_path = os.path.join(self.inputs_dir, job_id)
+            with open(input_path, "wb") as f:
+                if isinstance(input_data, (bytes, bytearray, memoryview)):
+                    f.write(input_data)
+                else:
+                    input_data.seek(0)
+                    shutil.copyfileobj(input_data, f, 1024 * 1024)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, batch_id, kind, status, params, input_path, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, batch_id, kind, json.dumps(params), input_path, time.time())
+            )
+        return job_id
+    
+    def claim(self, kind: str) -> Optional[sqlite3.Row]:
+        """Mark the oldest queued job of a kind as running and return it"""
+        with self._lock, self._db:
+            # Take the write lock before reading, so two worker processes can't claim the same job
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND status = 'queued' ORDER BY created_at LIMIT 1", (kind,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ? "
+                "WHERE id = ?",
+                (time.time(), os.getpid(), row["id"])
+            )
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+    
+    def requeue(self, job_id: str):
+        """Put a claimed job back at its place in the queue without counting the attempt"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND status = 'running'", (job_id,)
+            )
+    
+    def finish(self, job_id: str, status: str, result: Optional[dict] = None,
+               output_path: Optional[str] = None, error: Optional[str] = None):
+        with self._lock, self._db:
+            row = self._db.execute("SELECT input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, output_path = ?, error = ?, finished_at = ?, "
+                "input_path = NULL WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, output_path, error,
+                 time.time(), job_id)
+            )
+        # Inputs are only needed until the job has run
+        if row and row["input_path"]:
+            _unlink(row["input_path"])
+    
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet"""
+        with self._lock, self._db:
+            cancelled = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            ).rowcount
+            row = self._db.execute("SELECT input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if cancelled and row["input_path"]:
+            _unlink(row["input_path"])
+        return bool(cancelled)
+    
+    def read_input(self, job: sqlite3.Row) -> bytes:
+        with open(job["input_path"], "rb") as f:
+            return f.read()
+    
+    def write_output(self, job_id: str, data: bytes, suffix: str) -> str:
+        path = os.path.join(self.outputs_dir, f"{job_id}{suffix}")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+    
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    
+    def get_batch(self, batch_id: str) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,)
+            ).fetchall()
+    
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs (and their outputs) that finished before ``older_than``"""
+        with self._lock, self._db:
+            rows = self._db.execute(
+                "SELECT id, output_path FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (older_than,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+        for row in rows:
+            if row["output_path"]:
+                _unlink(row["output_path"])
+        return len(rows)
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status").fetchall()
+        stats = {kind: {} for kind in JOB_KINDS}
+        for row in rows:
+            stats.setdefault(row["kind"], {})[row["status"]] = row["n"]
+        return stats
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def job_to_dict(job: sqlite3.Row) -> dict:
+    """Public view of a job row"""
+    state = {
+        "job_id": job["id"],
+        "batch_id": job["batch_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    }
+    if job["error"]:
+        state["error"] = job["error"]
+    if job["result"]:
+        state["result"] = json.loads(job["result"])
+    if job["status"] == "completed":
+        state["output_url"] = f"/api/v1/jobs/{job['id']}/output"
+    return state
+
+class JobScheduler:
+    """Feeds queued jobs to the STT and TTS services
+    
+    Each kind has a fixed number of job slots. STT gets enough concurrent
+    jobs to fill a Whisper batch, and TTS enough to keep its worker pool
+    busy; interactive requests still share the same pools. A job rejected
+    by admission control goes back to the queue and is retried once the
+    service has room.
+    
+    When several worker processes share the queue, a job may run in a
+    different process than the one watching it; ``poll_seconds`` makes
+    watchers re-read the job that often instead of only on local changes.
+    """
+    
+    def __init__(self, queue: JobQueue, stt_service, tts_service,
+                 stt_concurrency: int = 8, tts_concurrency: int = 2,
+                 retention_seconds: float = 7 * 24 * 3600,
+                 poll_seconds: Optional[float] = None):
+        self.queue = queue
+        self.stt_service = stt_service
+        self.tts_service = tts_service
+        self.concurrency = {"stt": max(1, stt_concurrency), "tts": max(1, tts_concurrency)}
+        self.retention_seconds = retention_seconds
+        self.poll_seconds = poll_seconds
+        
+        self._wakeup: Dict[str, asyncio.Event] = {}
+        self._running = set()
+        self._loops: List[asyncio.Task] = []
+        self._changes = asyncio.Condition()
+        self._version = 0
+    
+    def start(self):
+        """Start one dispatch loop per job kind on the running event loop"""
+        if self._loops:
+            return
+        for kind in JOB_KINDS:
+            self._wakeup[kind] = asyncio.Event()
+            self._loops.append(asyncio.ensure_future(self._dispatch(kind)))
+        self._loops.append(asyncio.ensure_future(self._purge_forever()))
+    
+    async def stop(self):
+        """Stop dispatching; jobs still running are requeued on the next start"""
+        for task in self._loops + list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._loops, *self._running, return_exceptions=True)
+        self._loops = []
+        self.queue.close()
+    
+    async def submit(self, kind: str, items: List[dict],
+                     inputs: Optional[List[Union[bytes, BinaryIO]]] = None) -> dict:
+        """Queue a batch of jobs of one kind and return the batch and job ids"""
+        batch_id = uuid.uuid4().hex
+        loop = asyncio.get_event_loop()
+        job_ids = []
+        for i, params in enumerate(items):
+            # Jobs run later, in the batch lane, but still count towards their client's share
+            params = dict(params, client=current_client())
+            input_data = inputs[i] if inputs else None
+            job_ids.append(await loop.run_in_executor(
+                None, self.queue.submit, kind, params, batch_id, input_data
+            ))
+        if kind in self._wakeup:
+            self._wakeup[kind].set()
+        await self._notify()
+        return {"batch_id": batch_id, "job_ids": job_ids}
+    
+    async def _dispatch(self, kind: str):
+        loop = asyncio.get_event_loop()
+        slots = asyncio.Semaphore(self.concurrency[kind])
+        wakeup = self._wakeup[kind]
+        while True:
+            await slots.acquire()
+            job = None
+            while job is None:
+                # Cleared before looking, so a submit that lands in between still wakes us
+                wakeup.clear()
+                job = await loop.run_in_executor(None, self.queue.claim, kind)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=5.0)
+                    except asyncio.TimeoutError:
+                        pass
+            
+            task = asyncio.ensure_future(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+            await self._notify()
+    
+    async def _execute(self, job: sqlite3.Row):
+        loop = asyncio.get_event_loop()
+        job_id = job["id"]
+        params = json.loads(job["params"])
+        set_request_client(params.get("client"), BATCH)
+        try:
+            if job["kind"] == "stt":
+                await self._run_stt(job, params)
+            else:
+                await self._run_tts(job, params)
+        except OverloadedError as e:
+            # Interactive traffic filled the TTS or scheduler queue; wait and try again later
+            await loop.run_in_executor(None, self.queue.requeue, job_id)
+            await asyncio.sleep(e.retry_after)
+            self._wakeup[job["kind"]].set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await self._finish(job_id, "failed", error=str(e))
+        await self._notify()
+    
+    async def _run_stt(self, job: sqlite3.Row, params: dict):
+        loop = asyncio.get_event_loop()
+        audio_data = await loop.run_in_executor(None, self.queue.read_input, job)
+        result = await self.stt_service.transcribe_audio(
+            audio_data, language=params.get("language"), task=params.get("task", "transcribe"),
+            model_name=params.get("model")
+        )
+        if not result["success"]:
+            await self._finish(job["id"], "failed", error=result.get("error", "Failed to transcribe audio"))
+            return
+        result.pop("success")
+        await self._finish(job["id"], "completed", result=result)
+    
+    async def _run_tts(self, job: sqlite3.Row, params: dict):
+        fmt = params.get("format") or "wav"
+        audio_bytes = await self.tts_service.synthesize_audio(
+            params["text"], params.get("voice", "af_heart"), fmt,
+            sample_rate=params.get("sample_rate"), bitrate=params.get("bitrate")
+        )
+        if audio_bytes is None:
+            await self._finish(job["id"], "failed", error="Failed to generate speech")
+            return
+        loop = asyncio.get_event_loop()
+        path = await loop.run_in_executor(None, self.queue.write_output, job["id"], audio_bytes, FORMATS[fmt][1])
+        await self._finish(job["id"], "completed", output_path=path, result={
+            "format": fmt,
+            "media_type": media_type(fmt, params.get("sample_rate") or KOKORO_SAMPLE_RATE),
+            "size": len(audio_bytes)
+        })
+    
+    async def _finish(self, job_id: str, status: str, **kwargs):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, functools.partial(self.queue.finish, job_id, status, **kwargs))
+    
+    async def _notify(self):
+        async with self._changes:
+            self._version += 1
+            self._changes.notify_all()
+    
+    async def watch(self, job_id: str, keepalive_seconds: float = 15.0) -> AsyncGenerator[Optional[dict], None]:
+        """Yield a job's state whenever its status changes, until it finishes
+        
+        ``None`` is yielded after ``keepalive_seconds`` without changes.
+        """
+        last_status = None
+        seen = -1
+        timeout = min(keepalive_seconds, self.poll_seconds or keepalive_seconds)
+        last_yield = time.monotonic()
+        while True:
+            # Only wait under the lock: a consumer suspended at a yield must
+            # not keep _notify() (and with it the whole scheduler) waiting
+            async with self._changes:
+                try:
+                    await asyncio.wait_for(
+                        self._changes.wait_for(lambda: self._version != seen), timeout
+                    )
+                    seen = self._version
+                    timed_out = False
+                except asyncio.TimeoutError:
+                    timed_out = True
+            if timed_out and not self.poll_seconds:
+                yield None
+                continue
+            job = await asyncio.get_event_loop().run_in_executor(None, self.queue.get, job_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                last_yield = time.monotonic()
+                yield job_to_dict(job)
+            elif time.monotonic() - last_yield >= keepalive_seconds:
+                last_yield = time.monotonic()
+                yield None
+            if job["status"] in FINISHED_STATUSES:
+                return
+    
+    async def _purge_forever(self):
+        while True:
+            try:
+                removed = await asyncio.get_event_loop().run_in_executor(
+                    None, self.queue.purge, time.time() - self.retention_seconds
+                )
+                if removed:
+                    logger.info(f"Purged {removed} finished jobs")
+            except Exception as e:
+                logger.error(f"Error purging finished jobs: {e}")
+            await asyncio.sleep(3600)
+    
+    def get_stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "concurrency": self.concurrency,
+            "jobs": self.queue.get_stats()
+        }
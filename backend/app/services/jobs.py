@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncGenerator, Optional
+
+logger = logging.getLogger(__name__)
+
+class TranscriptionJob:
+    """State of one background transcription, observable while it runs"""
+    
+    def __init__(self, job_id: str, total: int = 0):
+        self.id = job_id
+        self.status = "queued"  # queued, running, completed, failed
+        self.total = total
+        self.done = 0
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._version = 0
+        self._changed = asyncio.Condition()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+    
+    @property
+    def progress(self) -> float:
+        if self.status == "completed":
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+    
+    async def update(self, **fields):
+        """Change job fields and wake up anyone watching the job"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if self.finished and self.finished_at is None:
+            self.finished_at = time.time()
+        async with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+    
+    async def watch(self, keepalive_seconds: float = 15.0) -> AsyncGenerator[Optional[dict], None]:
+        """Yield the job state after every change until it finishes
+        
+        ``None`` is yielded when nothing changed for ``keepalive_seconds``,
+        so callers can keep idle connections open.
+        """
+        seen = -1
+        while True:
+            # Yield only after releasing the lock, so a slow reader can't hold up update()
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._version != seen), keepalive_seconds
+                    )
+                    seen = self._version
+                    timed_out = False
+                except asyncio.TimeoutError:
+                    timed_out = True
+            if timed_out:
+                yield None
+                continue
+            state = self.to_dict()
+            yield state
+            if self.finished:
+                return
+    
+    def to_dict(self, include_result: bool = True) -> dict:
+        state = {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "windows_done": self.done,
+            "windows_total": self.total,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        if self.error:
+            state["error"] = self.error
+        if include_result and self.result is not None:
+            state["result"] = self.result
+        return state
+
+class JobStore:
+    """In-memory index of recent jobs
+    
+    Only the newest ``max_jobs`` jobs are kept; the oldest finished ones are
+    dropped first. Jobs that are still running are never dropped.
+    """
+    
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max(1, max_jobs)
+        self._jobs: "OrderedDict[str, TranscriptionJob]" = OrderedDict()
+    
+    def create(self, total: int = 0) -> TranscriptionJob:
+        job = TranscriptionJob(uuid.uuid4().hex, total)
+        self._jobs[job.id] = job
+        self._trim()
+        return job
+    
+    def get(self, job_id: str) -> Optional[TranscriptionJob]:
+        return self._jobs.get(job_id)
+    
+    def _trim(self):
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(0, excess)]:
+            del self._jobs[job_id]
+    
+    def get_stats(self) -> dict:
+        statuses = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": len(self._jobs), "by_status": statuses}
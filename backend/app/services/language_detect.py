@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from app.services.audio_decode import AudioSource, WHISPER_SAMPLE_RATE
+from app.services.vad import EnergyVAD
+
+# Whisper only ever looks at the first 30 seconds to pick a language
+DETECT_SEARCH_SECONDS = 30.0
+
+def audio_key(audio_data: AudioSource) -> str:
+    """Content hash identifying an uploaded audio file, given as bytes or a seekable file"""
+    if isinstance(audio_data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(audio_data).hexdigest()
+    # Read in chunks rather than with hashlib.file_digest, which needs Python 3.11
+    audio_data.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: audio_data.read(1 << 20), b""):
+        digest.update(chunk)
+    audio_data.seek(0)
+    return digest.hexdigest()
+
+def first_voiced_clip(audio: np.ndarray, seconds: float, sample_rate: int = WHISPER_SAMPLE_RATE,
+                      threshold_db: float = -45.0, frame_ms: int = 30, pad_ms: int = 200) -> np.ndarray:
+    """Get ``seconds`` of audio starting just before the first frame of speech
+    
+    Leading silence or noise is skipped so the clip is mostly speech. If no
+    speech onset is found (e.g. the clip starts mid-sentence, or is silent)
+    the clip starts at the beginning.
+    """
+    vad = EnergyVAD(threshold_db=threshold_db)
+    frame = int(sample_rate * frame_ms / 1000)
+    start = 0
+    for offset in range(0, len(audio) - frame + 1, frame):
+        if vad.is_speech(audio[offset:offset + frame]):
+            start = max(0, offset - int(sample_rate * pad_ms / 1000))
+            break
+    return audio[start:start + int(seconds * sample_rate)]
+
+class LanguageCache:
+    """LRU of language detection results, keyed by audio hash or session
+    
+    Also lets a transcription of audio whose language was just detected
+    pass that language to Whisper and skip its own detection pass.
+    """
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+    
+    def peek(self, key: str) -> Optional[dict]:
+        """Look up a result without counting a hit or miss"""
+        with self._lock:
+            return self._entries.get(key)
+    
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
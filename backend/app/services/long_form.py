@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Tuple
+import numpy as np
+from config import settings
+from app.services.audio_decode import WHISPER_SAMPLE_RATE
+from app.services.fair_scheduler import BATCH, scheduler
+
+logger = logging.getLogger(__name__)
+
+# Each window must start at least this much later than the previous one
+MIN_WINDOW_STEP_S = 1.0
+
+# Whisper model of a pool worker process, loaded by the pool initializer
+_worker_models = {}
+
+def _init_worker(model_name: str, threads: int):
+    """Pool initializer: split the CPU between workers and load the model once per process"""
+    from app.services.whisper_backends import configure_threads
+    configure_threads(threads, 1)
+    _worker_model(model_name)
+
+def _worker_model(model_name: str):
+    model = _worker_models.get(model_name)
+    if model is None:
+        from app.services.model_cache import ModelArtifactCache
+        from app.services.whisper_backends import load_whisper_model
+        # One model per worker process; a job for another model replaces it
+        _worker_models.clear()
+        cache = ModelArtifactCache(settings.MODEL_CACHE_DIR) if settings.MODEL_CACHE_DIR else None
+        model = _worker_models[model_name] = load_whisper_model(model_name, cache=cache)
+    return model
+
+def transcribe_window(model_name: str, audio: np.ndarray, language: Optional[str], task: str) -> dict:
+    """Transcribe one window in a pool worker process"""
+    options = {"task": task}
+    if language:
+        options["language"] = language
+    result = _worker_model(model_name).transcribe(audio, **options)
+    return {
+        "language": result.get("language"),
+        "segments": [
+            {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+            for segment in result.get("segments", [])
+        ]
+    }
+
+def _smoothed_energy(audio: np.ndarray, frame: int, smooth_frames: int = 10) -> np.ndarray:
+    """Frame RMS averaged over ``smooth_frames`` frames, so dips are real pauses rather than plosives"""
+    n_frames = len(audio) // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    kernel = np.ones(smooth_frames) / smooth_frames
+    return np.convolve(rms, kernel, mode="same")
+
+def plan_windows(audio: np.ndarray, sample_rate: int = WHISPER_SAMPLE_RATE,
+                 window_s: float = 30.0, overlap_s: float = 2.0, search_s: float = 5.0,
+                 frame_ms: int = 30) -> List[Tuple[int, int]]:
+    """Split audio into overlapping (start, end) sample ranges of at most ``window_s``
+    
+    Each window ends at the quietest point of its last ``search_s`` seconds,
+    and the next one starts ``overlap_s`` before that cut, so a word that
+    crosses the cut is still heard whole by one of the two windows.
+    """
+    n = len(audio)
+    window = int(window_s * sample_rate)
+    if n <= window:
+        return [(0, n)]
+    
+    overlap = int(overlap_s * sample_rate)
+    # Never cut so early that the next window would barely move on
+    search = min(int(search_s * sample_rate), window - overlap - int(MIN_WINDOW_STEP_S * sample_rate))
+    if search < 0:
+        raise ValueError(f"overlap_s must be at least {MIN_WINDOW_STEP_S:g}s shorter than window_s")
+    frame = int(sample_rate * frame_ms / 1000)
+    energy = _smoothed_energy(audio, frame)
+    
+    windows = []
+    start = 0
+    while n - start > window:
+        first = -(-(start + window - search) // frame)
+        last = (start + window) // frame
+        if last > first:
+            cut = min((first + int(np.argmin(energy[first:last]))) * frame, start + window)
+        else:
+            cut = start + window
+        windows.append((start, cut))
+        start = cut - overlap
+    windows.append((start, n))
+    return windows
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w\s]", "", text).lower().strip()
+
+def stitch_segments(windows: List[Tuple[float, float, List[dict]]]) -> List[dict]:
+    """Merge per-window segments into one ordered list on the recording's timeline
+    
+    ``windows`` holds (start_s, end_s, segments) per window, with segment
+    times relative to the window. Within each overlap, segments centred
+    before its midpoint come from the earlier window and the rest from the
+    later one; a segment that repeats the text just before it is dropped.
+    """
+    stitched = []
+    for i, (offset, end, segments) in enumerate(windows):
+        lower = (offset + windows[i - 1][1]) / 2 if i > 0 else float("-inf")
+        upper = (windows[i + 1][0] + end) / 2 if i < len(windows) - 1 else float("inf")
+        for segment in segments:
+            start_s = offset + segment["start"]
+            end_s = min(offset + segment["end"], end)
+            if not lower <= (start_s + end_s) / 2 < upper:
+                continue
+            text = segment["text"].strip()
+            if not text:
+                continue
+            previous = stitched[-1] if stitched else None
+            if previous and start_s < previous["end"] and _normalize(text) == _normalize(previous["text"]):
+                continue
+            stitched.append({"id": len(stitched), "start": round(start_s, 3), "end": round(end_s, 3), "text": text})
+    return stitched
+
+class LongFormTranscriber:
+    """Transcribes long recordings as overlapping windows transcribed in parallel
+    
+    Windows run on a pool of ``workers`` processes, each with its own copy
+    of the Whisper model (so memory grows with the worker count). With
+    ``workers`` set to 0 the windows are transcribed one at a time in this
+    process instead, through ``run_inline``.
+    """
+    
+    def __init__(self, workers: int = 2, window_s: float = 30.0, overlap_s: float = 2.0):
+        if overlap_s < 0 or window_s - overlap_s < MIN_WINDOW_STEP_S:
+            raise ValueError(
+                f"Long-form windows of {window_s:g}s need an overlap between 0 and "
+                f"{window_s - MIN_WINDOW_STEP_S:g}s, got {overlap_s:g}s"
+            )
+        self.workers = max(0, workers)
+        self.window_s = window_s
+        self.overlap_s = overlap_s
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_pool(self, model_name: str) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned rather than forked: torch state does not survive a fork safely
+            threads = settings.STT_INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_name, threads)
+            )
+            logger.info(f"Started {self.workers} long-form transcription workers with {threads} threads each")
+        return self._pool
+    
+    async def transcribe(self, audio: np.ndarray, model_name: str,
+                         language: Optional[str], task: str,
+                         run_inline: Callable[[np.ndarray, Optional[str]], Awaitable[dict]],
+                         on_progress: Callable[[int, int], Awaitable[None]]) -> dict:
+        """Transcribe a decoded 16kHz waveform window by window
+        
+        Args:
+            audio: Decoded audio samples
+            model_name: Whisper model to use
+            language: Language code. None detects it on the first window and
+                uses it for the rest, so every window agrees
+            task: Either 'transcribe' or 'translate'
+            run_inline: Transcribes one window in this process (used without a pool)
+            on_progress: Called with (windows done, windows total) as windows finish
+        
+        Returns:
+            Dict with the stitched text, language, segments and duration
+        """
+        windows = plan_windows(audio, WHISPER_SAMPLE_RATE, self.window_s, self.overlap_s)
+        done = 0
+        await on_progress(done, len(windows))
+        # Windows queue behind interactive requests, and a job holds no more
+        # scheduler slots than it has processes to use them
+        running = asyncio.Semaphore(max(1, self.workers))
+        
+        async def run(bounds: Tuple[int, int], language: Optional[str]) -> dict:
+            nonlocal done
+            piece = audio[bounds[0]:bounds[1]]
+            async with running, scheduler.slot("stt", len(piece) / WHISPER_SAMPLE_RATE, lane=BATCH):
+                if self.workers:
+                    loop = asyncio.get_event_loop()
+                    result = await loop.run_in_executor(
+                        self._get_pool(model_name), transcribe_window, model_name, piece, language, task
+                    )
+                else:
+                    result = await run_inline(piece, language)
+            done += 1
+            await on_progress(done, len(windows))
+            return result
+        
+        pending = windows
+        results = []
+        if not language:
+            results.append(await run(windows[0], None))
+            language = results[0].get("language")
+            pending = windows[1:]
+        
+        if self.workers:
+            results += await asyncio.gather(*[run(bounds, language) for bounds in pending])
+        else:
+            for bounds in pending:
+                results.append(await run(bounds, language))
+        
+        segments = stitch_segments([
+            (start / WHISPER_SAMPLE_RATE, end / WHISPER_SAMPLE_RATE, result.get("segments", []))
+            for (start, end), result in zip(windows, results)
+        ])
+        return {
+            "text": " ".join(segment["text"] for segment in segments),
+            "language": language or "unknown",
+            "segments": segments,
+            "duration": len(audio) / WHISPER_SAMPLE_RATE,
+            "windows": len(windows)
+        }
+    
+    def reset_after_fork(self):
+        """Drop the parent's pool in a forked worker; its processes belong to the parent"""
+        self._pool = None
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the way artifacts are built changes, so old files are not reused
+CACHE_FORMAT = 1
+
+class ModelArtifactCache:
+    """On-disk cache of loaded and converted models
+    
+    A model is stored as the whole pickled module after it has been built,
+    had its checkpoint loaded and been converted (e.g. quantized), so a
+    restart on the same node only unpickles it. Keys include the library
+    versions and device, and an artifact that fails to load is deleted and
+    rebuilt. Loading memory-maps the file where torch supports it.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def key(self, kind: str, name: str, *parts: Any) -> str:
+        """File name for an artifact, unique to everything it was built from"""
+        import torch
+        digest = hashlib.sha256(json.dumps([CACHE_FORMAT, torch.__version__, *parts], default=str).encode())
+        return f"{kind}-{name}-{digest.hexdigest()[:16]}.pt"
+    
+    def load(self, key: str, device: Optional[str] = None) -> Optional[Any]:
+        import torch
+        path = os.path.join(self.directory, key)
+        if not os.path.exists(path):
+            return None
+        start = time.perf_counter()
+        try:
+            try:
+                model = torch.load(path, map_location=device or "cpu", weights_only=False, mmap=True)
+            except TypeError:
+                # torch < 2.1 can't memory-map a checkpoint
+                model = torch.load(path, map_location=device or "cpu")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable model artifact {key}: {e}")
+            _unlink(path)
+            return None
+        logger.info(f"Loaded model artifact {key} in {time.perf_counter() - start:.2f}s")
+        return model
+    
+    def save(self, key: str, model: Any):
+        """Store a model; failures only cost the next start the conversion again"""
+        import torch
+        path = os.path.join(self.directory, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            torch.save(model, tmp_path)
+            os.replace(tmp_path, path)
+            logger.info(f"Saved model artifact {key}")
+        except Exception as e:
+            logger.warning(f"Could not cache model artifact {key}: {e}")
+            _unlink(tmp_path)
+    
+    def get_stats(self) -> dict:
+        artifacts = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".pt"):
+                try:
+                    artifacts.append({"name": name, "size": os.path.getsize(os.path.join(self.directory, name))})
+                except OSError:
+                    pass
+        return {"directory": self.directory, "artifacts": artifacts}
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
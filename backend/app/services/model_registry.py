@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def estimate_model_bytes(model: Any) -> int:
+    """Estimate the resident size of a torch module from its parameters and buffers"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    # Dynamically quantized layers keep packed weights outside parameters()
+    for module in model.modules():
+        if hasattr(module, "_packed_params") and callable(getattr(module, "weight", None)):
+            weight = module.weight()
+            total += weight.numel() * weight.element_size()
+    return total
+
+class _ModelEntry:
+    def __init__(self, model: Any, size: int):
+        self.model = model
+        self.size = size
+        self.refs = 0
+
+class ModelRegistry:
+    """Keeps several models resident within a memory budget
+    
+    Each model is loaded at most once: concurrent requests for the same name
+    wait on a per-name lock instead of loading their own copy. Callers take a
+    lease while they use a model; leased models are never evicted, so
+    switching the default model cannot free weights that an in-flight
+    request still needs. Idle models are evicted least-recently-used first
+    once the budget is exceeded.
+    """
+    
+    def __init__(self, loader: Callable[[str], Any], memory_budget_bytes: int,
+                 size_fn: Callable[[Any], int] = estimate_model_bytes):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.size_fn = size_fn
+        self._entries: "OrderedDict[str, _ModelEntry]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Guards _entries; leases are also released from worker threads
+        self._mutex = threading.Lock()
+    
+    def reset_after_fork(self):
+        """Recreate the locks in a forked worker; the loaded models are kept"""
+        self._locks = {}
+        self._mutex = threading.Lock()
+    
+    def is_loaded(self, name: str) -> bool:
+        with self._mutex:
+            return name in self._entries
+    
+    def peek(self, name: str) -> Optional[Any]:
+        """Get a loaded model without taking a lease or loading it"""
+        with self._mutex:
+            entry = self._entries.get(name)
+            return entry.model if entry else None
+    
+    async def load(self, name: str) -> Any:
+        """Load a model if it is not resident yet, with one loader per name"""
+        model = self.peek(name)
+        if model is not None:
+            return model
+        
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            model = self.peek(name)
+            if model is not None:
+                return model
+            
+            logger.info(f"Loading model: {name}")
+            loop = asyncio.get_event_loop()
+            model = await loop.run_in_executor(None, self.loader, name)
+            size = self.size_fn(model)
+            
+            with self._mutex:
+                self._entries[name] = _ModelEntry(model, size)
+                self._evict(keep=name)
+            logger.info(f"Model '{name}' loaded ({size / 1024 / 1024:.0f} MB)")
+            return model
+    
+    def acquire(self, name: str) -> Any:
+        """Take a lease on a resident model; pair every call with release()"""
+        with self._mutex:
+            entry = self._entries[name]
+            entry.refs += 1
+            self._entries.move_to_end(name)
+            return entry.model
+    
+    def release(self, name: str):
+        """Return a lease and evict anything that was only kept alive by it"""
+        with self._mutex:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.refs = max(0, entry.refs - 1)
+            self._evict()
+    
+    @asynccontextmanager
+    async def lease(self, name: str):
+        """Load (if needed) and hold a model for the duration of the block"""
+        while True:
+            await self.load(name)
+            try:
+                model = self.acquire(name)
+                break
+            except KeyError:
+                # Evicted between load and acquire; load it again
+                continue
+        try:
+            yield model
+        finally:
+            self.release(name)
+    
+    def _evict(self, keep: Optional[str] = None):
+        total = sum(entry.size for entry in self._entries.values())
+        for name in list(self._entries):
+            if total <= self.memory_budget_bytes:
+                break
+            entry = self._entries[name]
+            if name == keep or entry.refs > 0:
+                continue
+            del self._entries[name]
+            total -= entry.size
+            logger.info(f"Evicted model '{name}' to stay within memory budget")
+        
+        if total > self.memory_budget_bytes:
+            logger.warning(f"Resident models use {total} bytes, over the {self.memory_budget_bytes} byte budget")
+    
+    def get_stats(self) -> dict:
+        """Get resident models, their sizes and lease counts"""
+        with self._mutex:
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": sum(entry.size for entry in self._entries.values()),
+                "models": {
+                    name: {"size_bytes": entry.size, "in_use": entry.refs}
+                    for name, entry in self._entries.items()
+                }
+            }
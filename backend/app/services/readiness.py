@@ -0,0 +1,51 @@
+import time
+from typing import Iterable, Optional
+
+class LoadProgress:
+    """Progress of a model loading in the background, for the readiness check
+    
+    Loading goes through a fixed list of named stages; entering a stage
+    marks every stage before it as done, so a stage that is skipped (e.g.
+    conversion, on a cache hit) still counts towards the progress.
+    """
+    
+    def __init__(self, stages: Iterable[str]):
+        self.stages = list(stages)
+        self.state = "pending"  # pending, loading, ready, failed
+        self.stage: Optional[str] = None
+        self.completed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    def begin(self, stage: str):
+        if self.started_at is None:
+            self.started_at = time.time()
+        self.state = "loading"
+        self.stage = stage
+        self.completed = max(self.completed, self.stages.index(stage))
+    
+    def finish(self):
+        self.state = "ready"
+        self.stage = None
+        self.completed = len(self.stages)
+        self.finished_at = time.time()
+    
+    def fail(self, error: Exception):
+        self.state = "failed"
+        self.error = str(error)
+        self.finished_at = time.time()
+    
+    @property
+    def progress(self) -> float:
+        return self.completed / len(self.stages) if self.stages else 1.0
+    
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else None,
+            "error": self.error
+        }
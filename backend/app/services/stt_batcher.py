@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class TranscriptionBatcher:
+    """Dynamic micro-batching scheduler for Whisper
+    
+    Requests are collected for up to ``max_wait_ms`` milliseconds or until
+    ``max_batch_size`` clips are waiting, then decoded together in a single
+    forward pass. Requests for different models or language/task/prompt
+    options are batched separately. Every caller awaits its own future.
+    """
+    
+    def __init__(self, run_batch: Callable[[Any, List[np.ndarray], Optional[str], str, Optional[str]], List[dict]],
+                 max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        
+        self.batches_run = 0
+        self.items_run = 0
+    
+    async def submit(self, model: Any, audio: np.ndarray, language: Optional[str], task: str,
+                     prompt: Optional[str] = None) -> dict:
+        """Queue a clip for the next batch and wait for its transcription"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+        
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put((model, audio, (language, task, prompt), future))
+        return await future
+    
+    async def _collect(self) -> list:
+        """Wait for the first request, then gather more until the batch is full or the window closes"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._collect()
+            
+            groups: dict = {}
+            for model, audio, options, future in batch:
+                key = (id(model), options)
+                groups.setdefault(key, (model, []))[1].append((audio, future))
+            
+            for (_, options), (model, items) in groups.items():
+                await self._run_group(loop, model, items, options)
+    
+    async def _run_group(self, loop, model: Any, items: List[Tuple[np.ndarray, asyncio.Future]],
+                         options: Tuple[Optional[str], str, Optional[str]]):
+        audios = [audio for audio, _ in items]
+        try:
+            results = await loop.run_in_executor(None, self.run_batch, model, audios, *options)
+        except Exception as e:
+            logger.error(f"Batched transcription of {len(items)} clips failed: {e}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self.batches_run += 1
+        self.items_run += len(items)
+        logger.debug(f"Transcribed batch of {len(items)} clips")
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+    
+    def reset_after_fork(self):
+        """Forget the queue and worker task, which belong to the parent's event loop"""
+        self._queue = None
+        self._worker = None
+    
+    def get_stats(self) -> dict:
+        """Get batching counters"""
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "average_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0
+        }
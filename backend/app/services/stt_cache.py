@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_used ON results (used_at);
+"""
+
+class TranscriptionCache:
+    """Cache of transcription results, keyed by audio hash and decoding options
+    
+    Results are kept in memory as JSON, evicting the least recently used
+    once there are more than ``max_entries`` or they take more than
+    ``max_bytes``. With ``db_path`` they are also written to a SQLite file,
+    itself bounded to ``db_max_bytes``, so they survive restarts and are
+    shared by every worker process using the same file.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int,
+                 db_path: Optional[str] = None, db_max_bytes: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.db_max_bytes = db_max_bytes
+        
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # Database usage as of this process's last write, so stats() needn't query it
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = self._connect()
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(audio_hash: str, model_name: str, language: Optional[str], task: str, backend: str) -> str:
+        """Hash the uploaded audio's hash and everything that changes the transcript into a cache key"""
+        digest = hashlib.sha256(f"{audio_hash}\0{model_name}\0{backend}\0{language or ''}\0{task}".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        self._disk_entries, self._disk_bytes = self._disk_usage(db)
+        return db
+    
+    @staticmethod
+    def _disk_usage(db: sqlite3.Connection) -> Tuple[int, int]:
+        return db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+    
+    def reopen(self):
+        """Open a new connection, e.g. in a forked worker (connections must not cross a fork)"""
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._db = self._connect()
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached result for the key, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(data)
+            
+            if self._db is not None:
+                try:
+                    with self._db:
+                        row = self._db.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+                        if row:
+                            self._db.execute("UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key))
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to read transcription cache entry {key}: {e}")
+                    row = None
+                if row:
+                    self.disk_hits += 1
+                    self._store_memory(key, row[0])
+                    return json.loads(row[0])
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, result: dict):
+        """Store a result in memory and, when persistent, in the database"""
+        try:
+            # Whisper can leave numpy scalars in segment fields
+            data = json.dumps(result, default=float)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Not caching transcription result {key}: {e}")
+            return
+        with self._lock:
+            self._store_memory(key, data)
+            if self._db is None or len(data) > self.db_max_bytes:
+                return
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, result, size, used_at) VALUES (?, ?, ?, ?)",
+                        (key, data, len(data), time.time())
+                    )
+                    self._evict_db()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write transcription cache entry {key}: {e}")
+    
+    def _store_memory(self, key: str, data: str):
+        if len(data) > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+    
+    def _evict_db(self):
+        entries, total = self._disk_usage(self._db)
+        while total > self.db_max_bytes:
+            rows = self._db.execute("SELECT key, size FROM results ORDER BY used_at LIMIT 100").fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                if total <= self.db_max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM results WHERE key = ?", evicted)
+            entries -= len(evicted)
+        self._disk_entries, self._disk_bytes = entries, total
+    
+    def stats(self) -> dict:
+        """Get hit/miss counters and usage
+        
+        Reads counters kept by put() instead of querying the database, and
+        skips the lock, so the event loop never waits on database I/O. Disk
+        usage is as of this process's last write.
+        """
+        persistent = self._db is not None
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": self._disk_entries if persistent else None,
+            "disk_bytes": self._disk_bytes if persistent else None
+        }
@@ -1,135 +1,477 @@
-import os
-import tempfile
-import subprocess
 import asyncio
-from typing import Optional
-import whisper
+from typing import Any, BinaryIO, List, Optional
+import numpy as np
 import logging
+import os
+import shutil
+import tempfile
+from config import settings
+from app.services.audio_decode import (
+    AudioSource, AudioTooLongError, decode_audio, WHISPER_SAMPLE_RATE, WHISPER_WINDOW_SAMPLES
+)
+from app.services.fair_scheduler import OverloadedError, scheduler
+from app.services.jobs import JobStore, TranscriptionJob
+from app.services.language_detect import (
+    DETECT_SEARCH_SECONDS, LanguageCache, audio_key, first_voiced_clip
+)
+from app.services.long_form import LongFormTranscriber
+from app.services.metrics import timed, with_request_context
+from app.services.model_cache import ModelArtifactCache
+from app.services.model_registry import ModelRegistry
+from app.services.readiness import LoadProgress
+from app.services.stt_batcher import TranscriptionBatcher
+from app.services.stt_cache import TranscriptionCache
+from app.services.whisper_backends import configure_threads, load_whisper_model
 
 logger = logging.getLogger(__name__)
 
+# Whisper's defaults for deciding a greedy decode needs a temperature fallback
+# (see whisper.transcribe), applied to batched clips
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
 class STTService:
     """Speech-to-Text service using OpenAI Whisper"""
     
     def __init__(self):
-        self.model = None
-        self.model_name = "base"  # Default model
+        self.model_name = settings.WHISPER_MODEL  # Default model
+        self.backend = settings.STT_BACKEND
         self.is_initialized = False
+        # Progress of the default model's load, for the readiness check
+        self.loading = LoadProgress(["import", "load", "optimize"])
+        self.model_cache = ModelArtifactCache(settings.MODEL_CACHE_DIR) if settings.MODEL_CACHE_DIR else None
+        # Whisper models are loaded once per name and can stay resident side by side
+        self.registry = ModelRegistry(self._load_model, settings.STT_MODEL_MEMORY_BYTES)
+        self.batcher = None
+        if settings.STT_BATCH_ENABLED:
+            self.batcher = TranscriptionBatcher(
+                self._transcribe_batch,
+                max_batch_size=settings.STT_BATCH_MAX_SIZE,
+                max_wait_ms=settings.STT_BATCH_MAX_WAIT_MS
+            )
+        # Long recordings are transcribed as background jobs, window by window
+        self.long_form = LongFormTranscriber(
+            workers=settings.STT_LONG_FORM_WORKERS,
+            window_s=settings.STT_LONG_FORM_WINDOW_S,
+            overlap_s=settings.STT_LONG_FORM_OVERLAP_S
+        )
+        self.jobs = JobStore(settings.STT_LONG_FORM_MAX_JOBS)
+        self._job_tasks = set()
+        # Uploads waiting for their job to decode them; jobs don't survive a restart, so neither do these
+        self.long_form_dir = os.path.join(settings.JOBS_DIR, "long-form")
+        shutil.rmtree(self.long_form_dir, ignore_errors=True)
+        # Detected languages by audio hash and by session
+        self.language_cache = LanguageCache(settings.STT_LANGUAGE_CACHE_SIZE)
+        # Finished transcripts by audio hash and options, so resubmitted audio costs no model time
+        self.result_cache = None
+        if settings.STT_RESULT_CACHE_ENABLED:
+            self.result_cache = TranscriptionCache(
+                settings.STT_RESULT_CACHE_MAX_ENTRIES,
+                settings.STT_RESULT_CACHE_MAX_BYTES,
+                db_path=settings.STT_RESULT_CACHE_DB or None,
+                db_max_bytes=settings.STT_RESULT_CACHE_DB_MAX_BYTES
+            )
+        # Transcriptions in progress by result cache key, shared by identical concurrent uploads
+        self._pending_results = {}
+    
+    def _load_model(self, model_name: str) -> Any:
+        """Load a Whisper model for the configured backend, tagged with its name for metrics labels"""
+        # Thread pools are sized before torch first uses them
+        configure_threads(settings.STT_INTRA_OP_THREADS, settings.STT_INTER_OP_THREADS)
+        on_stage = self.loading.begin if self.loading.state != "ready" else None
+        with timed("stt", "load_model", model_name):
+            model = load_whisper_model(model_name, self.backend, cache=self.model_cache, on_stage=on_stage)
+        model.model_name = model_name
+        return model
+    
+    @staticmethod
+    def _decode(audio_data: AudioSource, max_seconds: Optional[float] = None,
+                duration_limit: Optional[float] = None) -> np.ndarray:
+        with timed("stt", "decode"):
+            return decode_audio(audio_data, max_seconds=max_seconds, duration_limit=duration_limit)
+    
+    @property
+    def model(self) -> Optional[Any]:
+        """The default Whisper model, if it is loaded"""
+        return self.registry.peek(self.model_name)
         
-    async def initialize(self, model_name: str = "base"):
+    async def initialize(self, model_name: Optional[str] = None):
         """Initialize the Whisper model"""
+        model_name = model_name or self.model_name
         try:
-            self.model_name = model_name
             logger.info(f"Loading Whisper model: {model_name}")
             
-            # Load model in a separate thread to avoid blocking
-            loop = asyncio.get_event_loop()
-            self.model = await loop.run_in_executor(
-                None, whisper.load_model, model_name
-            )
+            # The registry loads in a separate thread and only once per model,
+            # even if startup and the first requests race to initialize
+            await self.registry.load(model_name)
             
+            self.model_name = model_name
             self.is_initialized = True
+            self.loading.finish()
             logger.info(f"Whisper model '{model_name}' loaded successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Whisper model: {e}")
+            if not self.is_initialized:
+                self.loading.fail(e)
             raise
     
-    async def transcribe_audio(self, audio_data: bytes, 
+    def reset_after_fork(self, threads: int):
+        """Prepare a worker process forked after the models were loaded
+        
+        The worker keeps the loaded models, whose weights it shares with the
+        parent, but none of the parent's threads, event loop or long-form
+        pool, so whatever was bound to those is recreated.
+        """
+        configure_threads(threads, force=True)
+        self.registry.reset_after_fork()
+        if self.batcher:
+            self.batcher.reset_after_fork()
+        self.long_form.reset_after_fork()
+        self._job_tasks = set()
+        self._pending_results = {}
+        if self.result_cache:
+            self.result_cache.reopen()
+    
+    async def transcribe_audio(self, audio_data: AudioSource, 
                              language: Optional[str] = None,
-                             task: str = "transcribe") -> dict:
+                             task: str = "transcribe",
+                             model_name: Optional[str] = None,
+                             duration_limit: Optional[float] = None) -> dict:
         """
         Transcribe audio using Whisper
         
         Args:
-            audio_data: Audio file bytes
+            audio_data: Audio file bytes, or a seekable file holding them
             language: Language code (e.g., 'en', 'es', 'fr'). None for auto-detection
             task: Either 'transcribe' or 'translate'
+            model_name: Whisper model to use. None for the default model
+            duration_limit: Longest audio accepted, in seconds; longer audio
+                raises AudioTooLongError. None for no limit
             
         Returns:
             Dict with transcription results
+            
+        Raises:
+            OverloadedError: If too many requests are already waiting for a model slot
+        """
+        loop = asyncio.get_event_loop()
+        key = None
+        if self.result_cache or not language:
+            audio_hash = await loop.run_in_executor(None, audio_key, audio_data)
+        if self.result_cache:
+            key = self.result_cache.make_key(audio_hash, model_name or self.model_name, language, task, self.backend)
+            cached = await loop.run_in_executor(None, self.result_cache.get, key)
+            if cached is None and key in self._pending_results:
+                # The same audio is being transcribed for another request; share its result
+                shared = await asyncio.shield(self._pending_results[key])
+                cached = dict(shared) if shared else None
+            if cached is not None:
+                if duration_limit and cached["duration"] > duration_limit:
+                    raise AudioTooLongError(duration_limit)
+                logger.info(f"STT result cache hit for {cached['duration']:.1f}s of audio")
+                return cached
+        
+        if not language:
+            # Reuse a language already detected for this exact audio, so
+            # Whisper skips its own detection pass
+            detected = self.language_cache.peek(audio_hash)
+            if detected:
+                language = detected["language"]
+        
+        # Refuse before decoding if the request could not even queue for a slot
+        scheduler.check_admission()
+        if key is None:
+            return await self._decode_and_transcribe(audio_data, language, task, model_name, duration_limit)
+        
+        pending = loop.create_future()
+        self._pending_results[key] = pending
+        result = None
+        try:
+            result = await self._decode_and_transcribe(audio_data, language, task, model_name, duration_limit)
+            if result["success"]:
+                await loop.run_in_executor(None, self.result_cache.put, key, result)
+            return result
+        finally:
+            self._pending_results.pop(key, None)
+            # Requests waiting on this one transcribe for themselves if it failed
+            pending.set_result(dict(result) if result and result["success"] else None)
+    
+    async def _decode_and_transcribe(self, audio_data: AudioSource, language: Optional[str], task: str,
+                                     model_name: Optional[str], duration_limit: Optional[float]) -> dict:
+        try:
+            # Decode in a separate thread to avoid blocking
+            loop = asyncio.get_event_loop()
+            audio = await loop.run_in_executor(
+                None, with_request_context(self._decode, audio_data, None, duration_limit)
+            )
+            
+        except AudioTooLongError:
+            raise
+        except Exception as e:
+            logger.error(f"Error decoding audio: {e}")
+            return self._failed_result(e)
+        
+        return await self.transcribe_array(audio, language, task, model_name)
+    
+    async def transcribe_array(self, audio: np.ndarray,
+                               language: Optional[str] = None,
+                               task: str = "transcribe",
+                               model_name: Optional[str] = None,
+                               initial_prompt: Optional[str] = None) -> dict:
+        """
+        Transcribe an already decoded 16kHz mono float32 waveform
+        
+        Args:
+            audio: Decoded audio samples
+            language: Language code. None for auto-detection
+            task: Either 'transcribe' or 'translate'
+            model_name: Whisper model to use. None for the default model
+            initial_prompt: Text of the preceding speech, used as decoder context
+            
+        Returns:
+            Dict with transcription results
+            
+        Raises:
+            OverloadedError: If too many requests are already waiting for a model slot
         """
         if not self.is_initialized:
             await self.initialize()
         
+        model_name = model_name or self.model_name
         try:
-            # Save audio data to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
+            if model_name not in self.get_available_models():
+                raise ValueError(f"Invalid model name. Available models: {self.get_available_models()}")
             
             # Transcribe in a separate thread to avoid blocking
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, self._transcribe_file, temp_file_path, language, task
-            )
-            
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+            async with scheduler.slot("stt", len(audio) / WHISPER_SAMPLE_RATE), \
+                    self.registry.lease(model_name) as model:
+                # Clips that fit in one Whisper window can share a batched decode
+                if self.batcher and len(audio) <= WHISPER_WINDOW_SAMPLES:
+                    result = await self.batcher.submit(model, audio, language, task, initial_prompt)
+                else:
+                    result = await loop.run_in_executor(None, with_request_context(
+                        self._transcribe, model, audio, language, task, initial_prompt
+                    ))
             
             return {
                 "success": True,
                 "text": result["text"],
                 "language": result.get("language", "unknown"),
                 "segments": result.get("segments", []),
-                "duration": result.get("duration", 0.0)
+                "duration": result.get("duration", 0.0),
+                "model": model_name
             }
             
+        except OverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Error during transcription: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "text": "",
-                "language": "unknown",
-                "segments": [],
-                "duration": 0.0
-            }
+            return self._failed_result(e)
+    
+    def save_long_form_upload(self, upload: BinaryIO) -> str:
+        """Copy an upload to disk for a long-form job and return the file's path
+        
+        The file object is copied in chunks from its start.
+        """
+        os.makedirs(self.long_form_dir, exist_ok=True)
+        upload.seek(0)
+        with tempfile.NamedTemporaryFile(dir=self.long_form_dir, delete=False) as f:
+            shutil.copyfileobj(upload, f, 1024 * 1024)
+        return f.name
+    
+    def start_long_transcription(self, audio_path: str,
+                                 language: Optional[str] = None,
+                                 task: str = "transcribe",
+                                 model_name: Optional[str] = None) -> TranscriptionJob:
+        """
+        Start transcribing a long recording in the background
+        
+        The audio is split into overlapping windows that are transcribed in
+        parallel; follow the returned job for progress and the stitched result.
+        
+        Args:
+            audio_path: Audio file, e.g. from save_long_form_upload; the job deletes it once decoded
+            language: Language code. None for auto-detection
+            task: Either 'transcribe' or 'translate'
+            model_name: Whisper model to use. None for the default model
+        """
+        job = self.jobs.create()
+        job_task = asyncio.ensure_future(self._run_long_transcription(job, audio_path, language, task, model_name))
+        self._job_tasks.add(job_task)
+        job_task.add_done_callback(self._job_tasks.discard)
+        return job
+    
+    def _decode_long_form(self, audio_path: str) -> np.ndarray:
+        try:
+            with open(audio_path, "rb") as f:
+                return self._decode(f, None, settings.STT_LONG_FORM_MAX_DURATION_S or None)
+        finally:
+            os.remove(audio_path)
+    
+    async def _run_long_transcription(self, job: TranscriptionJob, audio_path: str,
+                                      language: Optional[str], task: str,
+                                      model_name: Optional[str]):
+        try:
+            loop = asyncio.get_event_loop()
+            audio = await loop.run_in_executor(None, self._decode_long_form, audio_path)
+            
+            if not self.is_initialized:
+                await self.initialize()
+            model_name = model_name or self.model_name
+            
+            await job.update(status="running")
+            
+            async def run_inline(window: np.ndarray, window_language: Optional[str]) -> dict:
+                async with self.registry.lease(model_name) as model:
+                    return await loop.run_in_executor(
+                        None, self._transcribe, model, window, window_language, task
+                    )
+            
+            async def on_progress(done: int, total: int):
+                await job.update(done=done, total=total)
+            
+            result = await self.long_form.transcribe(audio, model_name, language, task, run_inline, on_progress)
+            result.update({"success": True, "model": model_name})
+            await job.update(status="completed", result=result)
+            logger.info(f"Long-form job {job.id} finished: {result['duration']:.1f}s of audio in {result['windows']} windows")
+            
+        except Exception as e:
+            logger.error(f"Error in long-form transcription job {job.id}: {e}")
+            await job.update(status="failed", error=str(e))
+    
+    @staticmethod
+    def _failed_result(error: Exception) -> dict:
+        return {
+            "success": False,
+            "error": str(error),
+            "text": "",
+            "language": "unknown",
+            "segments": [],
+            "duration": 0.0
+        }
     
-    def _transcribe_file(self, file_path: str, language: Optional[str], task: str) -> dict:
-        """Internal method to transcribe file using Whisper"""
+    def _transcribe(self, model: Any, audio: np.ndarray, language: Optional[str], task: str,
+                    initial_prompt: Optional[str] = None) -> dict:
+        """Internal method to transcribe a decoded waveform using Whisper"""
         options = {}
         if language:
             options["language"] = language
         if task == "translate":
             options["task"] = "translate"
+        if initial_prompt:
+            options["initial_prompt"] = initial_prompt
             
-        result = self.model.transcribe(file_path, **options)
+        # Whisper computes the log-mel inside transcribe, so this stage covers mel + decoding
+        with timed("stt", "transcribe", model.model_name):
+            result = model.transcribe(audio, **options)
+        result["duration"] = len(audio) / WHISPER_SAMPLE_RATE
         return result
     
-    async def detect_language(self, audio_data: bytes) -> dict:
-        """Detect the language of the audio"""
+    def _transcribe_batch(self, model: Any, audios: List[np.ndarray], language: Optional[str], task: str,
+                          prompt: Optional[str] = None) -> List[dict]:
+        """Internal method to transcribe several clips of up to 30 seconds in one decoder pass
+        
+        The batched pass is a single greedy decode without timestamps, so each
+        clip comes back as one segment. Clips whose decode fails Whisper's own
+        quality checks (repetitive or low-confidence output) are transcribed
+        again with model.transcribe, which retries at higher temperatures.
+        """
+        import torch
+        import whisper
+        n_mels = model.dims.n_mels
+        with timed("stt", "mel", model.model_name):
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels)
+                for audio in audios
+            ]).to(model.device)
+        
+        options = whisper.DecodingOptions(
+            task=task,
+            language=language,
+            prompt=prompt or None,
+            without_timestamps=True,
+            fp16=model.device.type != "cpu"
+        )
+        with timed("stt", "batch_decode", model.model_name):
+            decoded = whisper.decode(model, mel, options)
+        
+        results = []
+        for audio, result in zip(audios, decoded):
+            duration = len(audio) / WHISPER_SAMPLE_RATE
+            silent = (result.no_speech_prob > NO_SPEECH_THRESHOLD
+                      and result.avg_logprob < LOGPROB_THRESHOLD)
+            if not silent and (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                               or result.avg_logprob < LOGPROB_THRESHOLD):
+                results.append(self._transcribe(model, audio, language, task, prompt))
+                continue
+            text = "" if silent else result.text.strip()
+            results.append({
+                "text": text,
+                "language": result.language,
+                "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text}],
+                "duration": duration
+            })
+        return results
+    
+    async def detect_language(self, audio_data: AudioSource, session_id: Optional[str] = None) -> dict:
+        """
+        Detect the language of the audio
+        
+        Only the first seconds of speech are decoded and analysed. Results
+        are cached by audio hash, and by ``session_id`` when given, so a
+        session's later clips are answered without running the model.
+        """
+        loop = asyncio.get_event_loop()
+        key = await loop.run_in_executor(None, audio_key, audio_data)
+        for cache_key in filter(None, (key, session_id and f"session:{session_id}")):
+            cached = self.language_cache.get(cache_key)
+            if cached:
+                return {**cached, "cached": True}
+        
         if not self.is_initialized:
             await self.initialize()
             
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-            
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, self._detect_language_file, temp_file_path
-            )
-            
-            os.unlink(temp_file_path)
-            return result
+            async with scheduler.slot("stt", settings.STT_DETECT_SECONDS), \
+                    self.registry.lease(self.model_name) as model:
+                result = await loop.run_in_executor(
+                    None, with_request_context(self._detect_language_bytes, model, audio_data)
+                )
             
+        except OverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Error during language detection: {e}")
             return {"language": "unknown", "confidence": 0.0}
+        
+        self.language_cache.put(key, result)
+        if session_id:
+            self.language_cache.put(f"session:{session_id}", result)
+        return {**result, "cached": False}
     
-    def _detect_language_file(self, file_path: str) -> dict:
+    def _detect_language_bytes(self, model: Any, audio_data: AudioSource) -> dict:
         """Internal method to detect language"""
-        # Load audio and pad/trim it to fit 30 seconds
-        audio = whisper.load_audio(file_path)
-        audio = whisper.pad_or_trim(audio)
+        # Whisper only uses the first 30 seconds, so nothing later is decoded
+        audio = self._decode(audio_data, max_seconds=DETECT_SEARCH_SECONDS)
+        return self._detect_language_array(model, audio)
+    
+    def _detect_language_array(self, model: Any, audio: np.ndarray) -> dict:
+        """Internal method to detect language from the first seconds of voiced audio"""
+        import whisper
+        clip = first_voiced_clip(audio, settings.STT_DETECT_SECONDS, threshold_db=settings.STT_VAD_THRESHOLD_DB)
         
-        # Make log-Mel spectrogram and move to the same device as the model
-        mel = whisper.log_mel_spectrogram(audio).to(self.model.device)
+        # The encoder needs a 30 second mel, but only the clip is analysed;
+        # the rest is padded in the mel domain, as Whisper does for short final windows
+        with timed("stt", "mel", model.model_name):
+            mel = whisper.log_mel_spectrogram(clip, model.dims.n_mels)
+            mel = whisper.pad_or_trim(mel, whisper.audio.N_FRAMES).to(model.device)
         
         # Detect the spoken language
-        _, probs = self.model.detect_language(mel)
+        with timed("stt", "language_detect", model.model_name):
+            _, probs = model.detect_language(mel)
         detected_language = max(probs, key=probs.get)
         confidence = probs[detected_language]
         
@@ -163,15 +505,19 @@ class STTService:
             raise ValueError(f"Invalid model name. Available models: {self.get_available_models()}")
         
         logger.info(f"Changing model from {self.model_name} to {model_name}")
+        # The previous model stays resident (and usable by in-flight requests)
+        # until the registry evicts it
         await self.initialize(model_name)
     
     def get_model_info(self) -> dict:
         """Get information about the current model"""
         return {
             "model_name": self.model_name,
+            "backend": self.backend,
             "is_initialized": self.is_initialized,
             "supported_languages": len(self.get_supported_languages()),
-            "available_models": self.get_available_models()
+            "available_models": self.get_available_models(),
+            "resident_models": self.registry.get_stats()
         }
     
     @property
@@ -188,5 +534,9 @@ class STTService:
         return {
             "service": "OpenAI Whisper",
             "model": self.model_name,
-            "status": "ready" if self.is_initialized else "not ready"
+            "status": "ready" if self.is_initialized else "not ready",
+            "batching": self.batcher.get_stats() if self.batcher else None,
+            "long_form_jobs": self.jobs.get_stats(),
+            "language_cache": self.language_cache.get_stats(),
+            "result_cache": self.result_cache.stats() if self.result_cache else None
         } 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+import numpy as np
+from config import settings
+from app.services.audio_decode import resample, WHISPER_SAMPLE_RATE
+from app.services.fair_scheduler import OverloadedError
+from app.services.vad import EnergyVAD, UtteranceSegmenter
+
+logger = logging.getLogger(__name__)
+
+# How much previous text is fed back to Whisper as context for the next utterance
+PROMPT_CARRY_CHARS = 200
+
+class StreamingTranscriber:
+    """Incremental transcription for one real-time audio stream
+    
+    Incoming PCM is segmented into utterances by voice activity. While an
+    utterance is in progress it is re-transcribed every partial interval and
+    sent as a ``partial`` result; once it ends it is transcribed once more
+    with the previous utterances as prompt and sent as ``final``.
+    """
+    
+    def __init__(self, stt_service, send: Callable[[dict], Awaitable[None]],
+                 sample_rate: int = WHISPER_SAMPLE_RATE,
+                 language: Optional[str] = None,
+                 model_name: Optional[str] = None):
+        self.stt_service = stt_service
+        self.send = send
+        self.sample_rate = sample_rate
+        self.language = language
+        self.model_name = model_name
+        self.segmenter = UtteranceSegmenter(
+            sample_rate,
+            vad=EnergyVAD(threshold_db=settings.STT_VAD_THRESHOLD_DB),
+            min_silence_ms=settings.STT_VAD_SILENCE_MS,
+            max_utterance_s=settings.STT_STREAM_MAX_UTTERANCE_S
+        )
+        self.partial_interval = settings.STT_STREAM_PARTIAL_INTERVAL_MS / 1000.0
+        
+        self._utterance = 0
+        self._transcript = ""
+        self._samples_since_partial = 0
+        self._partial_task: Optional[asyncio.Task] = None
+        self._finals: asyncio.Queue = asyncio.Queue()
+        self._final_worker = asyncio.ensure_future(self._run_finals())
+    
+    async def feed_pcm16(self, data: bytes):
+        """Add a chunk of 16-bit little-endian mono PCM"""
+        samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2').astype(np.float32) / 32768.0
+        for start, utterance in self.segmenter.feed(samples):
+            self._finish_utterance(start, utterance)
+        
+        if self.segmenter.in_speech:
+            self._samples_since_partial += len(samples)
+            if (self._samples_since_partial >= self.partial_interval * self.sample_rate
+                    and (self._partial_task is None or self._partial_task.done())):
+                self._samples_since_partial = 0
+                self._partial_task = asyncio.ensure_future(
+                    self._send_partial(self._utterance, self.segmenter.current_audio())
+                )
+    
+    async def finish(self):
+        """Flush the utterance in progress and wait for all final results"""
+        flushed = self.segmenter.flush()
+        if flushed is not None:
+            self._finish_utterance(*flushed)
+        await self._finals.put(None)
+        await self._final_worker
+    
+    def close(self):
+        """Stop background work without flushing (client went away)"""
+        self._final_worker.cancel()
+        if self._partial_task:
+            self._partial_task.cancel()
+    
+    def _finish_utterance(self, start: float, audio: np.ndarray):
+        self._finals.put_nowait((self._utterance, start, audio))
+        self._utterance += 1
+        self._samples_since_partial = 0
+    
+    async def _transcribe(self, audio: np.ndarray) -> dict:
+        if self.sample_rate != WHISPER_SAMPLE_RATE:
+            audio = resample(audio, self.sample_rate, WHISPER_SAMPLE_RATE)
+        try:
+            return await self.stt_service.transcribe_array(
+                audio,
+                language=self.language,
+                model_name=self.model_name,
+                initial_prompt=self._transcript[-PROMPT_CARRY_CHARS:] or None
+            )
+        except OverloadedError as e:
+            return {"success": False, "error": f"{e}, try again later"}
+    
+    async def _send_partial(self, utterance: int, audio: np.ndarray):
+        result = await self._transcribe(audio)
+        # Drop partials that arrive after their utterance was finalized
+        if result["success"] and utterance == self._utterance:
+            await self.send({"type": "partial", "utterance": utterance, "text": result["text"].strip()})
+    
+    async def _run_finals(self):
+        while True:
+            item = await self._finals.get()
+            if item is None:
+                return
+            utterance, start, audio = item
+            result = await self._transcribe(audio)
+            if not result["success"]:
+                await self.send({"type": "error", "utterance": utterance, "detail": result.get("error")})
+                continue
+            
+            text = result["text"].strip()
+            self._transcript = f"{self._transcript} {text}".strip()
+            await self.send({
+                "type": "final",
+                "utterance": utterance,
+                "text": text,
+                "start": start,
+                "end": start + len(audio) / self.sample_rate,
+                "language": result.get("language")
+            })
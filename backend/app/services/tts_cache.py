@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class TTSAudioCache:
+    """Content-addressed cache for synthesized audio
+    
+    Entries are keyed on a hash of the normalized text, voice and output
+    encoding (format, sample rate, bitrate).
+    Recently used audio is kept in memory; everything is also written to an
+    on-disk tier so it survives restarts. Both tiers evict least-recently-used
+    entries once their byte limit is exceeded.
+    
+    With ``shared`` set, several worker processes use the same directory,
+    each indexing the files it wrote against its own ``disk_limit_bytes``;
+    a lookup that misses the index falls back to the directory. A
+    background sweeper goes through the whole directory by modification
+    time and removes the oldest files past ``shared_limit_bytes``, which
+    bounds the directory whatever each worker's index holds.
+    """
+    
+    def __init__(self, cache_dir: str, memory_limit_bytes: int, disk_limit_bytes: int,
+                 shared: bool = False, shared_limit_bytes: Optional[int] = None,
+                 sweep_interval_seconds: float = 60.0):
+        self.cache_dir = cache_dir
+        self.memory_limit_bytes = memory_limit_bytes
+        self.disk_limit_bytes = disk_limit_bytes
+        self.shared = shared
+        self.shared_limit_bytes = shared_limit_bytes if shared_limit_bytes is not None else disk_limit_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+        
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.disk_limit_bytes > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if self.shared:
+                # Files from a previous run are found through the directory and bounded by the sweep
+                self.sweep()
+            else:
+                self._load_disk_index()
+    
+    @staticmethod
+    def make_key(text: str, voice: str, sample_rate: int, fmt: str = "wav",
+                 bitrate: Optional[str] = None) -> str:
+        """Hash the normalized synthesis inputs into a cache key"""
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(f"{voice}\0{sample_rate}\0{fmt}\0{bitrate or ''}\0{normalized}".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.audio")
+    
+    def _load_disk_index(self):
+        """Rebuild the disk tier index from files left by a previous run, oldest first"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".audio"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-len(".audio")], stat.st_size))
+        
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        logger.info(f"TTS cache loaded {len(self._disk)} entries ({self._disk_bytes} bytes) from disk")
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for the key, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+        
+        # Another worker may have written the entry
+        if on_disk or (self.shared and self.disk_limit_bytes > 0):
+            try:
+                path = self._path(key)
+                with open(path, "rb") as f:
+                    data = f.read()
+                if self.shared:
+                    # Mark it recently used for the sweeper
+                    os.utime(path)
+            except OSError:
+                with self._lock:
+                    self._forget_disk(key)
+                data = None
+            
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store_memory(key, data)
+                return data
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def contains(self, key: str) -> bool:
+        """Check whether the key is cached in either tier"""
+        with self._lock:
+            return key in self._memory or key in self._disk
+    
+    def put(self, key: str, data: bytes):
+        """Store audio in memory and on disk"""
+        with self._lock:
+            self._store_memory(key, data)
+            if self.disk_limit_bytes <= 0 or key in self._disk or len(data) > self.disk_limit_bytes:
+                return
+        
+        try:
+            # Write to a temporary name first so readers never see a partial file
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write TTS cache entry {key}: {e}")
+            return
+        
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            self._evict_disk()
+    
+    def _store_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_limit_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_limit_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+    
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+    
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_limit_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+    
+    def sweep(self) -> int:
+        """Remove the oldest files of every worker past the shared limit; returns how many were removed"""
+        if not self.shared or self.disk_limit_bytes <= 0:
+            return 0
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".audio"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name[:-len(".audio")]))
+        files.sort()
+        
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, key in files:
+            if total <= self.shared_limit_bytes:
+                break
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            with self._lock:
+                self._forget_disk(key)
+        return removed
+    
+    async def _sweep_forever(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                removed = await loop.run_in_executor(None, self.sweep)
+                if removed:
+                    logger.info(f"Swept {removed} TTS cache files over the shared limit")
+            except Exception as e:
+                logger.error(f"Error sweeping TTS cache: {e}")
+    
+    def start(self):
+        """Start the background sweeper on the running event loop, when the directory is shared"""
+        if not self.shared or self.disk_limit_bytes <= 0:
+            return
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.ensure_future(self._sweep_forever())
+    
+    async def stop(self):
+        """Stop the background sweeper"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+    
+    def stats(self) -> dict:
+        """Get hit/miss counters and tier usage"""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes
+            }
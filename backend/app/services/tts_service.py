@@ -1,102 +1,623 @@
 import asyncio
 import logging
 import os
-import tempfile
-from typing import Optional, Generator
-import soundfile as sf
-import torch
-from kokoro import KPipeline
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, AsyncGenerator
+import numpy as np
+from config import settings
+from app.services.audio_decode import StreamingResampler, resample
+from app.services.audio_encoding import (
+    FORMATS, encode_audio, pcm16_bytes, streaming_wav_header, transcode_stream
+)
+from app.services.audio_store import AudioArtifactStore
+from app.services.fair_scheduler import OverloadedError, scheduler, speech_seconds
+from app.services.metrics import timed, with_request_context
+from app.services.model_cache import ModelArtifactCache
+from app.services.readiness import LoadProgress
+from app.services.tts_cache import TTSAudioCache
+from app.services.voice_registry import VoiceRegistry, voice_lang_code
+
+if TYPE_CHECKING:
+    # kokoro (and torch) are imported when the model is loaded, not with the app
+    from kokoro import KPipeline
 
 logger = logging.getLogger(__name__)
 
+# Kokoro always renders at 24kHz
+KOKORO_SAMPLE_RATE = 24000
+KOKORO_REPO_ID = 'hexgrad/Kokoro-82M'
+
+# Sentence ends, or line breaks
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """Split text into sentences, merging very short ones into their neighbour
+    
+    Kokoro only splits on newlines (or at its token limit), so a paragraph
+    usually comes back as one segment. Splitting first lets the first
+    sentence be played while the rest is still being synthesized.
+    """
+    sentences = []
+    for piece in _SENTENCE_BOUNDARY.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and len(sentences[-1]) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+def group_pieces(sentences: List[str], count: int) -> List[str]:
+    """Join consecutive sentences into at most ``count`` pieces of similar length"""
+    if len(sentences) <= count:
+        return sentences
+    target = sum(len(sentence) for sentence in sentences) / count
+    pieces = []
+    current = []
+    size = 0
+    for i, sentence in enumerate(sentences):
+        current.append(sentence)
+        size += len(sentence)
+        left = len(sentences) - i - 1
+        if left and len(pieces) < count - 1 and size >= target:
+            pieces.append(" ".join(current))
+            current = []
+            size = 0
+    pieces.append(" ".join(current))
+    return pieces
+
+def join_segments(segments: List[np.ndarray], gap_samples: int = 0, fade_samples: int = 0) -> np.ndarray:
+    """Concatenate audio segments into one preallocated buffer
+    
+    ``gap_samples`` of silence are inserted between segments, and each
+    segment edge next to a gap gets a short linear fade so the joins don't
+    click.
+    """
+    gaps = gap_samples * max(0, len(segments) - 1)
+    buffer = np.zeros(sum(len(segment) for segment in segments) + gaps, dtype=np.float32)
+    offset = 0
+    for i, segment in enumerate(segments):
+        end = offset + len(segment)
+        buffer[offset:end] = segment
+        fade = min(fade_samples, len(segment) // 2)
+        if fade and gap_samples:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            if i > 0:
+                buffer[offset:offset + fade] *= ramp
+            if i < len(segments) - 1:
+                buffer[end - fade:end] *= ramp[::-1]
+        offset = end + gap_samples
+    return buffer
+
+def _to_float32(audio) -> np.ndarray:
+    """Convert a Kokoro audio segment (tensor or array) to a 1-D float32 array"""
+    import torch
+    if isinstance(audio, torch.Tensor):
+        audio = audio.detach().cpu().numpy()
+    return np.asarray(audio, dtype=np.float32).reshape(-1)
+
+def _gap_samples() -> int:
+    return int(KOKORO_SAMPLE_RATE * settings.TTS_SENTENCE_GAP_MS / 1000)
+
+def _fade_samples() -> int:
+    return int(KOKORO_SAMPLE_RATE * 0.005)
+
+def _timed_g2p(g2p):
+    """Wrap a pipeline's G2P so phonemization time is recorded separately from inference"""
+    def wrapper(*args, **kwargs):
+        with timed("tts", "g2p"):
+            return g2p(*args, **kwargs)
+    return wrapper
+
+class TTSOverloadedError(OverloadedError):
+    """Raised when the synthesis queue is full and a request cannot be admitted"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("TTS queue is full", retry_after)
+
 class TTSService:
     def __init__(self):
         self.pipeline = None
         self.is_ready = False
         
+        # Synthesis runs on a dedicated pool; each worker thread builds its own
+        # KPipeline around the shared model weights
+        self.max_workers = max(1, settings.TTS_WORKERS)
+        self.max_queue = max(0, settings.TTS_MAX_QUEUE)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts")
+        self._local = threading.local()
+        self._pending = 0
+        
+        # Voice tensors are shared by every worker's pipelines
+        self.voices = VoiceRegistry(self._load_voice, settings.TTS_MAX_LOADED_VOICES)
+        self.warmup_state = "pending"
+        # Progress of the startup load, for the readiness check
+        self.loading = LoadProgress(["load", "voices", "warmup"])
+        self.model_cache = ModelArtifactCache(settings.MODEL_CACHE_DIR) if settings.MODEL_CACHE_DIR else None
+        
+        # Forked workers share the directory, each with its share of the quota
+        workers = max(1, settings.WORKERS)
+        self.audio_store = AudioArtifactStore(
+            settings.TEMP_AUDIO_DIR,
+            ttl_seconds=settings.AUDIO_TTL_SECONDS,
+            max_bytes=settings.AUDIO_MAX_BYTES // workers,
+            sweep_interval_seconds=settings.AUDIO_SWEEP_INTERVAL_SECONDS,
+            shared=workers > 1,
+            shared_max_bytes=settings.AUDIO_MAX_BYTES
+        )
+        self.cache = None
+        if settings.TTS_CACHE_ENABLED:
+            self.cache = TTSAudioCache(
+                os.path.join(settings.TEMP_AUDIO_DIR, 'cache'),
+                settings.TTS_CACHE_MEMORY_BYTES,
+                settings.TTS_CACHE_DISK_BYTES // workers,
+                shared=workers > 1,
+                shared_limit_bytes=settings.TTS_CACHE_DISK_BYTES,
+                sweep_interval_seconds=settings.AUDIO_SWEEP_INTERVAL_SECONDS
+            )
+        
     async def initialize(self):
         """Initialize Kokoro TTS pipeline"""
+        if self.is_ready:
+            # Already loaded, e.g. by the parent of a forked worker
+            return
         try:
             logger.info("Loading Kokoro TTS pipeline...")
-            # Initialize Kokoro pipeline with language code 'a' (English)
-            self.pipeline = KPipeline(lang_code='a')
-            self.is_ready = True
+            loop = asyncio.get_event_loop()
+            self.loading.begin("load")
+            self.pipeline = await loop.run_in_executor(None, self._load_pipeline)
             logger.info("Kokoro TTS pipeline loaded successfully")
             
+            self.loading.begin("voices")
+            await loop.run_in_executor(None, self.voices.preload, settings.TTS_PRELOAD_VOICES)
+            if settings.TTS_WARMUP:
+                self.loading.begin("warmup")
+                await self._warm_up()
+            self.is_ready = True
+            self.loading.finish()
+            
         except Exception as e:
             logger.error(f"Error initializing Kokoro TTS service: {e}")
             self.is_ready = False
+            self.loading.fail(e)
     
-    async def synthesize_speech(self, text: str, voice: str = 'af_heart') -> Optional[str]:
-        """Synthesize speech from text and return audio file path"""
+    def _load_pipeline(self) -> "KPipeline":
+        """Build the first pipeline, with the model from the artifact cache when it is enabled"""
+        model = self._cached_model() if self.model_cache else None
+        # Language code 'a' (English)
+        return self._build_pipeline('a', model)
+    
+    def _cached_model(self):
+        """Load the Kokoro model from the artifact cache, or build it and save it there"""
+        import kokoro
+        import torch
+        from kokoro import KModel
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        key = self.model_cache.key("kokoro", "82M", KOKORO_REPO_ID, getattr(kokoro, "__version__", ""), device)
+        model = self.model_cache.load(key, device)
+        if model is None:
+            model = KModel(repo_id=KOKORO_REPO_ID).to(device).eval()
+            self.model_cache.save(key, model)
+        return model
+    
+    def _build_pipeline(self, lang_code: str, model=None) -> "KPipeline":
+        """Create a KPipeline, reusing already loaded model weights if given"""
+        from kokoro import KPipeline
+        if model is None:
+            return KPipeline(lang_code=lang_code)
+        return KPipeline(lang_code=lang_code, model=model)
+    
+    def _load_voice(self, voice: str):
+        """Load a voice tensor without leaving a copy in the loader pipeline's own cache"""
+        pack = self.pipeline.load_voice(voice)
+        self.pipeline.voices.pop(voice, None)
+        return pack
+    
+    def _get_pipeline(self, lang_code: str = 'a') -> "KPipeline":
+        """Get the KPipeline for a language owned by the current worker thread"""
+        pipelines = getattr(self._local, "pipelines", None)
+        if pipelines is None:
+            pipelines = self._local.pipelines = {}
+        pipeline = pipelines.get(lang_code)
+        if pipeline is None:
+            pipeline = self._build_pipeline(lang_code, self.pipeline.model)
+            pipeline.g2p = _timed_g2p(pipeline.g2p)
+            pipelines[lang_code] = pipeline
+        return pipeline
+    
+    def _voice_pipeline(self, voice: str):
+        """Get the worker's pipeline for a voice's language and the resident voice tensor"""
+        return self._get_pipeline(voice_lang_code(voice)), self.voices.get(voice)
+    
+    async def _warm_up(self):
+        """Build per-language pipelines on every worker and run one synthesis per preloaded voice
+        
+        A barrier makes each warm-up job land on a different worker thread,
+        so no thread is left to pay pipeline construction on a real request.
+        """
+        self.warmup_state = "warming"
+        voices = [voice for voice in settings.TTS_PRELOAD_VOICES if voice in self.voices.get_stats()["loaded"]]
+        barrier = threading.Barrier(self.max_workers)
+        
+        def warm():
+            try:
+                barrier.wait(timeout=30)
+            except threading.BrokenBarrierError:
+                pass
+            for voice in voices:
+                self._render_audio("Hello.", voice)
+        
+        try:
+            loop = asyncio.get_event_loop()
+            await asyncio.gather(*[
+                loop.run_in_executor(self._executor, warm) for _ in range(self.max_workers)
+            ])
+            self.warmup_state = "ready"
+            logger.info(f"TTS warm-up finished for voices: {voices}")
+        except Exception as e:
+            self.warmup_state = "failed"
+            logger.error(f"TTS warm-up failed: {e}")
+    
+    def reset_after_fork(self):
+        """Give a forked worker its own synthesis pool
+        
+        The parent's pool threads do not exist in the child. The model and
+        voice tensors are kept and shared; each new pool thread builds its
+        own KPipeline around them as usual.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts")
+        self._local = threading.local()
+        self._pending = 0
+    
+    def get_voice_stats(self) -> dict:
+        """Get voice load state and warm-up status"""
+        stats = self.voices.get_stats()
+        stats["warmup"] = self.warmup_state
+        return stats
+    
+    def check_capacity(self, count: int = 1):
+        """Raise TTSOverloadedError if ``count`` more jobs cannot be queued"""
+        if self._pending + count > self.max_workers + self.max_queue:
+            raise TTSOverloadedError(settings.TTS_RETRY_AFTER_SECONDS)
+    
+    def _submit(self, func, *args) -> asyncio.Future:
+        """Queue one job on the TTS pool
+        
+        The job counts as pending until its thread is done with it, even if
+        the caller has stopped waiting: cancelling a job that has started
+        does not stop the thread.
+        """
+        loop = asyncio.get_event_loop()
+        self._pending += 1
+        job = self._executor.submit(with_request_context(func, *args))
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(self._job_done))
+        return asyncio.wrap_future(job, loop=loop)
+    
+    def _job_done(self):
+        self._pending -= 1
+    
+    async def _run_in_worker(self, func, *args):
+        """Run blocking synthesis work on the TTS pool, subject to admission control"""
+        self.check_capacity()
+        return await self._submit(func, *args)
+    
+    def _submit_pieces(self, func, arg_lists: List[tuple]) -> List[asyncio.Future]:
+        """Submit several pieces of one request to the TTS pool at once
+        
+        The request is admitted only if there is room for all of its pieces.
+        """
+        self.check_capacity(len(arg_lists))
+        return [self._submit(func, *args) for args in arg_lists]
+    
+    def _parallel_pieces(self, text: str) -> Optional[List[str]]:
+        """Get the sentences to synthesize in parallel, or None if the text should run as one job"""
+        if self.max_workers < 2 or len(text) < settings.TTS_PARALLEL_MIN_CHARS:
+            return None
+        pieces = group_pieces(split_sentences(text), self.max_workers)
+        return pieces if len(pieces) > 1 else None
+    
+    async def _render_parallel(self, pieces: List[str], voice: str) -> Optional[np.ndarray]:
+        """Synthesize sentences across the worker pool and join them in order"""
+        futures = self._submit_pieces(self._render_audio, [(piece, voice) for piece in pieces])
+        try:
+            rendered = await asyncio.gather(*futures)
+        finally:
+            for future in futures:
+                future.cancel()
+        
+        segments = [audio for audio in rendered if audio is not None]
+        if not segments:
+            return None
+        return join_segments(segments, _gap_samples(), _fade_samples())
+    
+    def get_queue_stats(self) -> dict:
+        """Get current synthesis pool occupancy"""
+        return {
+            "workers": self.max_workers,
+            "in_flight": min(self._pending, self.max_workers),
+            "queue_depth": max(0, self._pending - self.max_workers),
+            "max_queue": self.max_queue
+        }
+    
+    def _render_audio(self, text: str, voice: str) -> Optional[np.ndarray]:
+        """Run every segment Kokoro yields for the text and join them into one buffer"""
+        logger.info(f"Generating audio for text: {text[:50]}...")
+        segments = []
+        pipeline, pack = self._voice_pipeline(voice)
+        # Includes G2P, which is also recorded on its own as the "g2p" stage
+        with timed("tts", "synthesis", voice=voice):
+            for i, (gs, ps, audio) in enumerate(pipeline(text, voice=pack)):
+                if audio is None:
+                    continue
+                segment = _to_float32(audio)
+                logger.info(f"Generated audio chunk {i}, shape: {segment.shape}")
+                segments.append(segment)
+        
+        if not segments:
+            return None
+        
+        # Copy each segment once into a preallocated buffer
+        return join_segments(segments)
+    
+    def cache_key(self, text: str, voice: str = 'af_heart', fmt: str = 'wav',
+                  sample_rate: Optional[int] = None, bitrate: Optional[str] = None) -> str:
+        """Get the content-addressed key (also used as ETag) for a synthesis request"""
+        return TTSAudioCache.make_key(
+            text, voice, sample_rate or KOKORO_SAMPLE_RATE, fmt=fmt, bitrate=bitrate
+        )
+    
+    def _encode(self, audio: np.ndarray, fmt: str, sample_rate: Optional[int],
+                bitrate: Optional[str]) -> bytes:
+        """Resample Kokoro's 24kHz output if requested and encode it"""
+        sample_rate = sample_rate or KOKORO_SAMPLE_RATE
+        with timed("tts", f"encode_{fmt}"):
+            if sample_rate != KOKORO_SAMPLE_RATE:
+                audio = resample(audio, KOKORO_SAMPLE_RATE, sample_rate)
+            return encode_audio(audio, sample_rate, fmt, bitrate)
+    
+    def _synthesize_encoded(self, text: str, voice: str, fmt: str,
+                            sample_rate: Optional[int], bitrate: Optional[str]) -> Optional[bytes]:
+        """Render and encode a full utterance; runs on a TTS worker thread"""
+        audio = self._render_audio(text, voice)
+        if audio is None:
+            return None
+        
+        audio_bytes = self._encode(audio, fmt, sample_rate, bitrate)
+        logger.info(f"Synthesized {len(audio) / KOKORO_SAMPLE_RATE:.2f}s of audio, {len(audio_bytes)} bytes of {fmt}")
+        return audio_bytes
+    
+    async def synthesize_audio(self, text: str, voice: str = 'af_heart', fmt: str = 'wav',
+                               sample_rate: Optional[int] = None,
+                               bitrate: Optional[str] = None) -> Optional[bytes]:
+        """Synthesize speech from text and return the encoded audio bytes
+        
+        Args:
+            text: Text to synthesize
+            voice: Kokoro voice id
+            fmt: Output format, one of FORMATS ('wav', 'pcm', 'flac', 'ogg', 'mp3')
+            sample_rate: Output sample rate. None keeps Kokoro's 24kHz
+            bitrate: Target bitrate for 'ogg' and 'mp3' (e.g. '32k')
+            
+        Raises:
+            OverloadedError: If the synthesis queue or the scheduler's queue is full
+        """
         if not self.is_ready:
             raise Exception("TTS service not initialized")
         
+        key = self.cache_key(text, voice, fmt, sample_rate, bitrate)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"TTS cache hit for text: {text[:50]}...")
+                return cached
+        
         try:
-            # Get the current working directory and create temp directory
-            current_dir = os.getcwd()
-            temp_dir = os.path.join(current_dir, 'temp', 'audio')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Create temporary file for audio output
-            temp_file = tempfile.NamedTemporaryFile(
-                delete=False, 
-                suffix='.wav',
-                dir=temp_dir
-            )
-            temp_file_path = temp_file.name
-            temp_file.close()
-            
-            # Generate audio using Kokoro
-            logger.info(f"Generating audio for text: {text[:50]}...")
-            generator = self.pipeline(text, voice=voice)
+            # Refuse before waiting for a slot if the pool is already full
+            self.check_capacity()
+            async with scheduler.slot("tts", speech_seconds(text)):
+                pieces = self._parallel_pieces(text)
+                if pieces:
+                    audio = await self._render_parallel(pieces, voice)
+                    audio_bytes = None
+                    if audio is not None:
+                        loop = asyncio.get_event_loop()
+                        audio_bytes = await loop.run_in_executor(
+                            None, with_request_context(self._encode, audio, fmt, sample_rate, bitrate)
+                        )
+                else:
+                    audio_bytes = await self._run_in_worker(
+                        self._synthesize_encoded, text, voice, fmt, sample_rate, bitrate
+                    )
+            if audio_bytes is None:
+                logger.error("TTS synthesis failed - no audio generated")
+                return None
             
-            # Get the first (and usually only) audio output
-            for i, (gs, ps, audio) in enumerate(generator):
-                logger.info(f"Generated audio chunk {i}, shape: {audio.shape}")
-                # Save audio using soundfile (24kHz sample rate for Kokoro)
-                sf.write(temp_file_path, audio, 24000)
-                break  # Only use the first generated audio
+            if self.cache:
+                self.cache.put(key, audio_bytes)
+            return audio_bytes
             
-            # Check if file was created and has content
-            if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) > 0:
-                logger.info(f"Audio saved to: {temp_file_path}, size: {os.path.getsize(temp_file_path)} bytes")
-                return temp_file_path
-            else:
-                logger.error("TTS synthesis failed - no audio file generated")
-                return None
-                
+        except OverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Error synthesizing speech with Kokoro: {e}")
             return None
     
-    async def synthesize_speech_stream(self, text: str, voice: str = 'af_heart') -> Generator[bytes, None, None]:
-        """Synthesize speech and yield audio chunks for streaming"""
+    async def synthesize_speech(self, text: str, voice: str = 'af_heart', fmt: str = 'wav') -> Optional[str]:
+        """Synthesize speech from text and return audio file path"""
+        audio_bytes = await self.synthesize_audio(text, voice, fmt)
+        if audio_bytes is None:
+            return None
+        
+        try:
+            # Write the already-encoded audio in a single pass; the store
+            # deletes it again once it expires
+            media_type, suffix = FORMATS[fmt]
+            artifact = self.audio_store.put(audio_bytes, suffix=suffix, media_type=media_type)
+            logger.info(f"Audio saved to: {artifact.path}, size: {artifact.size} bytes")
+            return artifact.path
+            
+        except Exception as e:
+            logger.error(f"Error saving synthesized speech: {e}")
+            return None
+    
+    async def synthesize_speech_stream(self, text: str, voice: str = 'af_heart', fmt: str = 'wav',
+                                       sample_rate: Optional[int] = None,
+                                       bitrate: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+        """Synthesize speech and yield encoded audio as soon as Kokoro produces it
+        
+        'wav' streams start with a WAV header whose size fields are left open
+        (0xFFFFFFFF), followed by 16-bit PCM frames; 'pcm' is the bare frames;
+        'ogg' and 'mp3' are encoded on the fly by ffmpeg with short pages.
+        Text is synthesized sentence by sentence, so the first frames arrive
+        after the first sentence rather than after the whole paragraph.
+        Callers should run check_capacity() and scheduler.check_admission()
+        before starting the response. The scheduler slot is released as soon
+        as synthesis finishes, however slowly the caller reads the audio.
+        """
         if not self.is_ready:
             raise Exception("TTS service not initialized")
         
+        output_rate = sample_rate or KOKORO_SAMPLE_RATE
+        
+        async def produce(frames: asyncio.Queue):
+            """Synthesize into the queue while holding a scheduler slot"""
+            # One resampler for the whole stream, so segment edges join smoothly
+            resampler = StreamingResampler(KOKORO_SAMPLE_RATE, output_rate) if output_rate != KOKORO_SAMPLE_RATE else None
+            loop = asyncio.get_event_loop()
+            try:
+                async with scheduler.slot("tts", speech_seconds(text)):
+                    segments = self._stream_segments(text, voice)
+                    try:
+                        async for segment in segments:
+                            if resampler:
+                                segment = await loop.run_in_executor(None, resampler.process, segment)
+                            frames.put_nowait(pcm16_bytes(segment))
+                    finally:
+                        await segments.aclose()
+                if resampler:
+                    frames.put_nowait(pcm16_bytes(resampler.flush()))
+            except OverloadedError:
+                logger.warning("Scheduler queue full, stream ended without audio")
+            finally:
+                frames.put_nowait(None)
+        
+        async def pcm_frames():
+            queue: asyncio.Queue = asyncio.Queue()
+            producer = asyncio.ensure_future(produce(queue))
+            try:
+                while True:
+                    chunk = await queue.get()
+                    if chunk is None:
+                        break
+                    yield chunk
+                await producer
+            finally:
+                if not producer.done():
+                    # The client went away mid-stream
+                    producer.cancel()
+                    try:
+                        await producer
+                    except asyncio.CancelledError:
+                        pass
+        
+        frames = pcm_frames()
         try:
-            # For Kokoro, we'll generate the full audio and then stream it
-            audio_file_path = await self.synthesize_speech(text, voice)
-            
-            if audio_file_path and os.path.exists(audio_file_path):
-                # Read file in chunks
-                with open(audio_file_path, 'rb') as f:
-                    chunk_size = 4096
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
-                
-                # Clean up temp file
+            if fmt in ("ogg", "mp3"):
+                encoded = transcode_stream(frames, output_rate, fmt, bitrate)
                 try:
-                    os.unlink(audio_file_path)
-                except:
-                    pass
-                    
+                    async for chunk in encoded:
+                        yield chunk
+                finally:
+                    await encoded.aclose()
+                return
+            
+            if fmt == "wav":
+                yield streaming_wav_header(output_rate)
+            async for chunk in frames:
+                yield chunk
+        finally:
+            await frames.aclose()
+    
+    async def _stream_segments(self, text: str, voice: str) -> AsyncGenerator[np.ndarray, None]:
+        """Yield 24kHz float32 audio segments in order as they are synthesized"""
+        pieces = self._parallel_pieces(text)
+        if pieces:
+            async for segment in self._stream_parallel(pieces, voice):
+                yield segment
+            return
+        
+        loop = asyncio.get_event_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        
+        def produce():
+            """Run the Kokoro generator in a worker thread and hand segments to the loop"""
+            try:
+                pipeline, pack = self._voice_pipeline(voice)
+                for sentence in split_sentences(text):
+                    for i, (gs, ps, audio) in enumerate(pipeline(sentence, voice=pack)):
+                        if stop.is_set():
+                            return
+                        if audio is None:
+                            continue
+                        logger.info(f"Streaming audio chunk {i}, shape: {audio.shape}")
+                        loop.call_soon_threadsafe(queue.put_nowait, _to_float32(audio))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+        
+        logger.info(f"Streaming audio for text: {text[:50]}...")
+        producer = asyncio.ensure_future(self._run_in_worker(produce))
+        # Unblock the consumer even if the job was never admitted to the pool
+        producer.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error streaming speech: {item}")
+                    break
+                yield item
+        finally:
+            # Stop synthesizing if the client went away mid-stream
+            stop.set()
+            try:
+                await producer
+            except TTSOverloadedError:
+                logger.warning("TTS queue full, stream ended without audio")
+    
+    async def _stream_parallel(self, pieces: List[str], voice: str) -> AsyncGenerator[np.ndarray, None]:
+        """Synthesize sentences in parallel and yield them in order as each one is ready"""
+        logger.info(f"Streaming {len(pieces)} sentences in parallel")
+        try:
+            futures = self._submit_pieces(self._render_audio, [(piece, voice) for piece in pieces])
+        except TTSOverloadedError:
+            logger.warning("TTS queue full, stream ended without audio")
+            return
+        
+        gap = np.zeros(_gap_samples(), dtype=np.float32)
+        try:
+            first = True
+            for future in futures:
+                audio = await future
+                if audio is None:
+                    continue
+                if not first:
+                    yield gap
+                first = False
+                yield audio
         except Exception as e:
             logger.error(f"Error streaming speech: {e}")
+        finally:
+            # Drop sentences nobody will hear if the client went away
+            for future in futures:
+                future.cancel()
     
     def get_available_voices(self) -> list:
         """Get list of available Kokoro voices"""
@@ -125,5 +646,6 @@ class TTSService:
             "status": "ready" if self.is_available() else "not available",
             "model": "Kokoro 82M parameters",
             "sample_rate": "24kHz",
-            "available_voices": len(self.get_available_voices())
+            "available_voices": len(self.get_available_voices()),
+            "cache": self.cache.stats() if self.cache else None
         } 
\ No newline at end of file
@@ -0,0 +1,141 @@
+import logging
+from typing import List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EnergyVAD:
+    """Frame-level voice activity detector based on signal energy
+    
+    A frame counts as speech when its RMS level is above both a fixed floor
+    (``threshold_db``) and the running noise estimate plus ``margin_db``. The
+    noise estimate only adapts during non-speech frames.
+    """
+    
+    def __init__(self, threshold_db: float = -45.0, margin_db: float = 10.0):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.noise_db: Optional[float] = None
+    
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(frame)))) if len(frame) else 0.0
+        level_db = 20.0 * np.log10(max(rms, 1e-10))
+        
+        if self.noise_db is None:
+            self.noise_db = level_db
+        
+        speech = level_db > max(self.threshold_db, self.noise_db + self.margin_db)
+        if not speech:
+            # Slow exponential average so short pauses don't drag the floor up
+            self.noise_db = 0.95 * self.noise_db + 0.05 * level_db
+        return speech
+
+class UtteranceSegmenter:
+    """Splits a stream of PCM samples into utterances using an EnergyVAD
+    
+    Feed arbitrary-sized chunks of mono float32 audio; complete utterances
+    (speech plus a little padding on each side) are returned as soon as
+    ``min_silence_ms`` of trailing silence is seen, or when an utterance
+    reaches ``max_utterance_s``, each with its start time in the stream.
+    """
+    
+    def __init__(self, sample_rate: int, vad: Optional[EnergyVAD] = None,
+                 frame_ms: int = 30, min_speech_ms: int = 150, min_silence_ms: int = 600,
+                 pad_ms: int = 200, max_utterance_s: float = 30.0):
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergyVAD()
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.min_silence_frames = max(1, min_silence_ms // frame_ms)
+        self.pad_frames = max(0, pad_ms // frame_ms)
+        self.max_utterance_frames = int(max_utterance_s * 1000 / frame_ms)
+        
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll: List[np.ndarray] = []
+        self._frames: List[np.ndarray] = []
+        self._speech_frames = 0
+        self._silence_frames = 0
+        self._in_speech = False
+        self._samples_seen = 0
+        self.utterance_start = 0.0
+    
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+    
+    def current_audio(self) -> np.ndarray:
+        """Audio of the utterance in progress, for partial transcription"""
+        if not self._frames:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._frames)
+    
+    def feed(self, samples: np.ndarray) -> List[Tuple[float, np.ndarray]]:
+        """Add samples and return any utterances that completed, as (start seconds, audio)"""
+        completed = []
+        self._pending = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+        
+        n_frames = len(self._pending) // self.frame_size
+        for i in range(n_frames):
+            frame = self._pending[i * self.frame_size:(i + 1) * self.frame_size]
+            utterance = self._process_frame(frame)
+            if utterance is not None:
+                completed.append(utterance)
+        self._pending = self._pending[n_frames * self.frame_size:]
+        return completed
+    
+    def flush(self) -> Optional[Tuple[float, np.ndarray]]:
+        """End the stream and return the utterance in progress as (start seconds, audio), if it contains speech"""
+        if self._in_speech and self._speech_frames >= self.min_speech_frames:
+            return self._finish()
+        self._reset()
+        return None
+    
+    def _process_frame(self, frame: np.ndarray) -> Optional[Tuple[float, np.ndarray]]:
+        self._samples_seen += len(frame)
+        speech = self.vad.is_speech(frame)
+        
+        if not self._in_speech:
+            self._preroll.append(frame)
+            if len(self._preroll) > self.pad_frames + 1:
+                self._preroll.pop(0)
+            if speech:
+                self._in_speech = True
+                self._frames = list(self._preroll)
+                self._preroll = []
+                self._speech_frames = 1
+                self._silence_frames = 0
+                self.utterance_start = max(0.0, (self._samples_seen - len(self._frames) * self.frame_size) / self.sample_rate)
+            return None
+        
+        self._frames.append(frame)
+        if speech:
+            self._speech_frames += 1
+            self._silence_frames = 0
+        else:
+            self._silence_frames += 1
+        
+        if self._silence_frames >= self.min_silence_frames:
+            if self._speech_frames >= self.min_speech_frames:
+                # Keep only pad_frames of the trailing silence
+                trim = self._silence_frames - self.pad_frames
+                if trim > 0:
+                    del self._frames[-trim:]
+                return self._finish()
+            # Too short to be speech (click, breath); drop it
+            self._reset()
+            return None
+        
+        if len(self._frames) >= self.max_utterance_frames:
+            return self._finish()
+        return None
+    
+    def _finish(self) -> Tuple[float, np.ndarray]:
+        utterance = (self.utterance_start, self.current_audio())
+        self._reset()
+        return utterance
+    
+    def _reset(self):
+        self._frames = []
+        self._speech_frames = 0
+        self._silence_frames = 0
+        self._in_speech = False
@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+def voice_lang_code(voice: str) -> str:
+    """Get the Kokoro language code for a voice ('af_heart' -> 'a', 'bf_emma' -> 'b')"""
+    return voice[0] if voice else 'a'
+
+class VoiceRegistry:
+    """Keeps Kokoro voice tensors resident across requests and worker threads
+    
+    Voices are loaded once (concurrent first uses wait on a per-voice lock)
+    and shared by every worker's pipeline. Pinned voices, such as the ones
+    preloaded at startup, are never evicted; the rest are evicted least
+    recently used once more than ``max_voices`` are loaded.
+    """
+    
+    def __init__(self, loader: Callable[[str], Any], max_voices: int = 8):
+        self.loader = loader
+        self.max_voices = max(1, max_voices)
+        self._voices: "OrderedDict[str, Any]" = OrderedDict()
+        self._pinned = set()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._mutex = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+    
+    def get(self, voice: str) -> Any:
+        """Get a voice tensor, loading it on first use"""
+        with self._mutex:
+            pack = self._voices.get(voice)
+            if pack is not None:
+                self._voices.move_to_end(voice)
+                return pack
+            lock = self._locks.setdefault(voice, threading.Lock())
+        
+        with lock:
+            with self._mutex:
+                pack = self._voices.get(voice)
+            if pack is not None:
+                return pack
+            
+            logger.info(f"Loading Kokoro voice: {voice}")
+            pack = self.loader(voice)
+            with self._mutex:
+                self._voices[voice] = pack
+                self.loads += 1
+                self._evict()
+            return pack
+    
+    def preload(self, voices: Iterable[str]):
+        """Load and pin voices so they stay resident"""
+        for voice in voices:
+            try:
+                self.get(voice)
+                with self._mutex:
+                    self._pinned.add(voice)
+            except Exception as e:
+                logger.error(f"Failed to preload voice '{voice}': {e}")
+    
+    def _evict(self):
+        for voice in list(self._voices):
+            if len(self._voices) <= self.max_voices:
+                break
+            if voice in self._pinned:
+                continue
+            del self._voices[voice]
+            self.evictions += 1
+            logger.info(f"Evicted voice '{voice}'")
+    
+    def get_stats(self) -> dict:
+        """Get loaded/pinned voices and load counters"""
+        with self._mutex:
+            return {
+                "loaded": list(self._voices),
+                "pinned": sorted(self._pinned),
+                "max_voices": self.max_voices,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
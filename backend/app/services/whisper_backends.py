@@ -0,0 +1,136 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+from config import settings
+from app.services.model_cache import ModelArtifactCache
+
+logger = logging.getLogger(__name__)
+
+# Optimizations that can be applied to a loaded Whisper model, by name.
+# A backend is a '+'-joined list of them, applied in order ("int8+compile");
+# "fp32" is the model exactly as whisper.load_model returns it.
+# torch and whisper are only imported once a model is loaded, so importing
+# the app stays fast.
+OPTIMIZATIONS: Dict[str, Callable[[Any], Any]] = {}
+
+_threads_configured = False
+
+def optimization(name: str, cacheable: bool = True):
+    """Register a model optimization under a backend name
+    
+    ``cacheable`` optimizations produce a model that can be saved to the
+    model artifact cache; the others are applied again after every load.
+    """
+    def register(func):
+        func.cacheable = cacheable
+        OPTIMIZATIONS[name] = func
+        return func
+    return register
+
+@optimization("int8")
+def quantize_int8(model: Any) -> Any:
+    """Dynamic int8 quantization of every Linear layer (CPU only)
+    
+    Whisper subclasses nn.Linear (to cast weights to the input dtype), and
+    quantize_dynamic only replaces exact nn.Linear instances, so the layers
+    are turned back into plain nn.Linear first. On CPU everything is fp32
+    anyway, so the cast is not needed.
+    """
+    import torch
+    from torch import nn
+    if model.device.type != "cpu":
+        logger.warning("int8 quantization only runs on CPU; keeping fp32 weights")
+        return model
+    for module in model.modules():
+        if isinstance(module, nn.Linear):
+            module.__class__ = nn.Linear
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+@optimization("compile", cacheable=False)
+def compile_encoder(model: Any) -> Any:
+    """Compile the audio encoder with torch.compile
+    
+    Only the encoder is compiled: its input is always a 30 second mel, so it
+    compiles once per batch size. The decoder's growing KV cache would make
+    it recompile at every step. A compiled module can't be pickled, so
+    this always runs after the model is loaded.
+    """
+    import torch
+    if not hasattr(torch, "compile"):
+        logger.warning("torch.compile is not available in this torch version; encoder left as is")
+        return model
+    model.encoder = torch.compile(model.encoder)
+    return model
+
+def parse_backend(backend: str) -> List[str]:
+    """Split a backend spec into the optimizations it applies"""
+    names = [name.strip() for name in backend.lower().split("+") if name.strip()]
+    names = [name for name in names if name != "fp32"]
+    unknown = [name for name in names if name not in OPTIMIZATIONS]
+    if unknown:
+        raise ValueError(f"Unknown STT backend {unknown}. Available: fp32, {', '.join(OPTIMIZATIONS)}")
+    return names
+
+def configure_threads(intra_op: int = 0, inter_op: int = 0, force: bool = False):
+    """Pin torch's intra-op and inter-op thread pools (0 keeps torch's default)
+    
+    The inter-op pool can only be sized before torch first uses it, so this
+    is meant to run once, before any model is loaded. ``force`` resizes the
+    pools again, e.g. in a worker forked from a process that already did.
+    """
+    global _threads_configured
+    if _threads_configured and not force:
+        return
+    _threads_configured = True
+    import torch
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+def load_whisper_model(model_name: str, backend: Optional[str] = None, device: Optional[str] = None,
+                       cache: Optional[ModelArtifactCache] = None,
+                       on_stage: Optional[Callable[[str], None]] = None) -> Any:
+    """Load a Whisper model and apply the optimizations of an inference backend
+    
+    Args:
+        model_name: Whisper model name ('tiny', 'base', 'small', ...)
+        backend: Backend spec such as 'fp32', 'int8' or 'int8+compile'.
+            None uses STT_BACKEND
+        device: Torch device. None uses CUDA when available, as Whisper does
+        cache: Artifact cache to load the converted model from, or to save
+            it to after converting it
+        on_stage: Called with 'import', 'load' and 'optimize' as loading
+            reaches each stage
+    """
+    stage = on_stage or (lambda name: None)
+    backend = backend or settings.STT_BACKEND
+    names = parse_backend(backend)
+    
+    stage("import")
+    import torch
+    import whisper
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    # Everything up to the first optimization that can't be pickled is cached
+    split = next((i for i, name in enumerate(names) if not OPTIMIZATIONS[name].cacheable), len(names))
+    cached, after_load = names[:split], names[split:]
+    
+    stage("load")
+    key = cache.key("whisper", model_name, getattr(whisper, "__version__", ""), cached, device) if cache else None
+    model = cache.load(key, device) if cache else None
+    if model is None:
+        model = whisper.load_model(model_name, device=device)
+        stage("optimize")
+        for name in cached:
+            model = OPTIMIZATIONS[name](model)
+        if cache:
+            cache.save(key, model)
+    
+    stage("optimize")
+    for name in after_load:
+        model = OPTIMIZATIONS[name](model)
+    model.backend = "+".join(names) or "fp32"
+    return model
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Identity of this process when it is a forked server worker, set by app.server
+current_worker: Optional[dict] = None
+
+def memory_usage() -> dict:
+    """Resident and shared memory of this process, from /proc (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            _, resident, shared = [int(value) for value in f.read().split()[:3]]
+    except (OSError, ValueError):
+        return {"rss_bytes": None, "shared_bytes": None}
+    page = os.sysconf("SC_PAGE_SIZE")
+    return {"rss_bytes": resident * page, "shared_bytes": shared * page}
+
+class WorkerHeartbeat:
+    """Periodically publishes this worker's state to a directory shared by all workers
+    
+    Each worker writes ``worker-<index>.json``; any worker can then report
+    the state of all of them, whichever one a health check reaches. A
+    worker whose file has not been refreshed for three intervals is
+    reported as not alive.
+    """
+    
+    def __init__(self, directory: str, worker: dict, status: Callable[[], dict], interval_seconds: float = 5.0):
+        self.directory = directory
+        self.worker = worker
+        self.status = status
+        self.interval_seconds = interval_seconds
+        self.path = os.path.join(directory, f"worker-{worker['index']}.json")
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+    
+    def write(self):
+        state = dict(self.worker)
+        state.update(memory_usage())
+        state.update(self.status())
+        state["heartbeat_at"] = time.time()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+    
+    async def _beat_forever(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.write)
+            except Exception as e:
+                logger.error(f"Error writing worker heartbeat: {e}")
+            await asyncio.sleep(self.interval_seconds)
+    
+    def start(self):
+        """Start publishing on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._beat_forever())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+def read_workers(directory: str, interval_seconds: float = 5.0) -> List[dict]:
+    """Last published state of every worker, ordered by index"""
+    workers = []
+    now = time.time()
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return workers
+    for name in names:
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        state["alive"] = now - state.get("heartbeat_at", 0) < 3 * interval_seconds
+        workers.append(state)
+    return sorted(workers, key=lambda state: state.get("index", 0))
+
+def clear_workers(directory: str):
+    """Remove the state files of a previous run"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith("worker-"):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
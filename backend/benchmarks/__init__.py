@@ -0,0 +1,6 @@
+"""Offline load/benchmark suite for the Valper AI API
+
+Run from the backend directory:
+
+    python -m benchmarks.run --backend stub --output results.json
+"""
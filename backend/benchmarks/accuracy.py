@@ -0,0 +1,161 @@
+"""Check Whisper inference backends for accuracy and speed on a reference set
+
+    python -m benchmarks.accuracy --model small --backends fp32,int8,int8+compile
+
+The reference set is either a directory of audio files with a ``.txt``
+transcript next to each (``--dataset``), or, by default, a fixed list of
+sentences synthesized with Kokoro. Every backend transcribes the same
+clips; the report gives word error rate against the references, agreement
+with the fp32 transcripts, and real-time factor. The exit status is 1 if a
+backend's WER is more than ``--max-wer-increase`` above fp32.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from typing import List, Tuple
+import numpy as np
+from config import settings
+from app.services.audio_decode import WHISPER_SAMPLE_RATE, decode_audio, resample
+from app.services.whisper_backends import configure_threads, load_whisper_model
+
+REFERENCE_SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Please set an alarm for seven thirty tomorrow morning.",
+    "What is the weather going to be like in Madrid this weekend?",
+    "Remind me to call my sister after the meeting ends.",
+    "The train to the airport leaves every fifteen minutes.",
+    "Could you read me the latest headlines from the news?",
+    "I would like to book a table for four people at eight o'clock.",
+    "Turn off the lights in the living room and lock the front door.",
+    "How many kilometers are there between Paris and Berlin?",
+    "Add milk, eggs, bread and two kilos of apples to my shopping list.",
+    "Our quarterly revenue grew by twelve percent compared to last year.",
+    "Play some relaxing music while I finish reading this chapter."
+]
+
+def _normalize(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_error_rate(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """Word-level edit distance and reference length"""
+    ref, hyp = _normalize(reference), _normalize(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(
+                row[j] + 1,
+                row[j - 1] + 1,
+                previous + (ref_word != hyp_word)
+            )
+    return row[-1], len(ref)
+
+def _corpus_wer(references: List[str], hypotheses: List[str]) -> float:
+    errors = words = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        e, n = word_error_rate(reference, hypothesis)
+        errors += e
+        words += n
+    return errors / words if words else 0.0
+
+def load_dataset(directory: str) -> List[Tuple[str, np.ndarray, str]]:
+    """Read (name, 16kHz audio, transcript) for every audio file with a .txt next to it"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        base, ext = os.path.splitext(path)
+        if ext == ".txt" or not os.path.exists(base + ".txt"):
+            continue
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read())
+        with open(base + ".txt") as f:
+            samples.append((os.path.basename(path), audio, f.read().strip()))
+    return samples
+
+def synthesize_dataset(voice: str = "af_heart") -> List[Tuple[str, np.ndarray, str]]:
+    """Render the reference sentences with Kokoro"""
+    from kokoro import KPipeline
+    pipeline = KPipeline(lang_code=voice[0])
+    samples = []
+    for i, sentence in enumerate(REFERENCE_SENTENCES):
+        segments = [np.asarray(audio, dtype=np.float32).reshape(-1)
+                    for _, _, audio in pipeline(sentence, voice=voice) if audio is not None]
+        audio = resample(np.concatenate(segments), 24000, WHISPER_SAMPLE_RATE)
+        samples.append((f"sentence_{i:02d}", audio, sentence))
+    return samples
+
+def evaluate(model_name: str, backend: str, samples, language: str) -> dict:
+    start = time.perf_counter()
+    model = load_whisper_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+    
+    # The first call pays one-off costs (e.g. torch.compile), keep it out of the timing
+    model.transcribe(samples[0][1], language=language)
+    
+    hypotheses = []
+    elapsed = 0.0
+    for _, audio, _ in samples:
+        start = time.perf_counter()
+        result = model.transcribe(audio, language=language)
+        elapsed += time.perf_counter() - start
+        hypotheses.append(result["text"].strip())
+    
+    audio_seconds = sum(len(audio) for _, audio, _ in samples) / WHISPER_SAMPLE_RATE
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "transcribe_seconds": round(elapsed, 3),
+        "real_time_factor": round(elapsed / audio_seconds, 4),
+        "wer": round(_corpus_wer([text for _, _, text in samples], hypotheses), 4),
+        "hypotheses": hypotheses
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Whisper inference backends on a reference set")
+    parser.add_argument("--model", default=settings.WHISPER_MODEL, help="Whisper model name")
+    parser.add_argument("--backends", default="fp32,int8", help="Comma-separated backend specs")
+    parser.add_argument("--dataset", help="Directory of audio files with .txt transcripts (default: synthesized)")
+    parser.add_argument("--language", default="en", help="Language passed to Whisper")
+    parser.add_argument("--max-wer-increase", type=float, default=0.02,
+                        help="Fail if a backend's WER exceeds fp32's by more than this")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+    
+    configure_threads(settings.STT_INTRA_OP_THREADS, settings.STT_INTER_OP_THREADS)
+    samples = load_dataset(args.dataset) if args.dataset else synthesize_dataset()
+    if not samples:
+        parser.error("The reference set is empty")
+    
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    if "fp32" not in backends:
+        backends.insert(0, "fp32")
+    
+    results = [evaluate(args.model, backend, samples, args.language) for backend in backends]
+    baseline = results[backends.index("fp32")]
+    failed = False
+    print(f"{'backend':16} {'WER':>7} {'vs fp32':>8} {'RTF':>8} {'speedup':>8}")
+    for result in results:
+        result["agreement_wer"] = round(_corpus_wer(baseline["hypotheses"], result["hypotheses"]), 4)
+        result["speedup"] = round(baseline["transcribe_seconds"] / result["transcribe_seconds"], 3)
+        result["passed"] = result["wer"] <= baseline["wer"] + args.max_wer_increase
+        failed = failed or not result["passed"]
+        print(f"{result['backend']:16} {result['wer']:7.2%} {result['agreement_wer']:8.2%} "
+              f"{result['real_time_factor']:8.3f} {result['speedup']:7.2f}x"
+              f"{'' if result['passed'] else '  FAILED'}")
+    
+    report = {
+        "model": args.model,
+        "dataset": args.dataset or "synthesized",
+        "samples": [{"name": name, "reference": text} for name, _, text in samples],
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
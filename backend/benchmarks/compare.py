@@ -0,0 +1,44 @@
+"""Compare two benchmark result files
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+
+def _index(report: dict) -> dict:
+    return {(r["scenario"], r["input"], r["concurrency"]): r for r in report["results"]}
+
+def _change(old: float, new: float) -> str:
+    if not old or new is None:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    
+    if baseline["meta"].get("corpus_version") != candidate["meta"].get("corpus_version"):
+        print("Warning: results were produced from different corpus versions")
+    
+    old, new = _index(baseline), _index(candidate)
+    print(f"{'scenario':16} {'input':12} {'c':>3}  {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        print(f"{key[0]:16} {key[1]:12} {key[2]:>3}  "
+              f"{_change(a['throughput_rps'], b['throughput_rps']):>8} "
+              f"{_change(a['latency_ms'].get('p50'), b['latency_ms'].get('p50')):>8} "
+              f"{_change(a['latency_ms'].get('p95'), b['latency_ms'].get('p95')):>8} "
+              f"{_change(a['latency_ms'].get('p99'), b['latency_ms'].get('p99')):>8}")
+    
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"only in {'baseline' if key in old else 'candidate'}: {' '.join(map(str, key))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import io
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+import soundfile as sf
+
+# Version of the generated corpus; bump it whenever the clips or texts change
+# so results from different corpora are never compared
+CORPUS_VERSION = 1
+
+CLIP_SAMPLE_RATE = 16000
+CLIP_DURATIONS = (1.0, 5.0, 15.0, 45.0)
+
+_WORDS = (
+    "valper listens to the question and answers with a short spoken reply "
+    "while the server keeps every model warm so the first words arrive quickly "
+    "long paragraphs are split into sentences and rendered across the workers"
+).split()
+
+@dataclass(frozen=True)
+class AudioClip:
+    name: str
+    duration: float
+    wav: bytes
+
+@dataclass(frozen=True)
+class TextSample:
+    name: str
+    text: str
+
+def _speech_like(duration: float, sample_rate: int, rng: np.random.Generator) -> np.ndarray:
+    """Voiced bursts (harmonic tone with a syllable-rate envelope) separated by pauses"""
+    n = int(duration * sample_rate)
+    t = np.arange(n, dtype=np.float32) / sample_rate
+    pitch = 110 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+    
+    # Switch between 0.4-1.5s of speech and 0.2-0.6s of silence
+    gate = np.zeros(n, dtype=np.float32)
+    pos = 0
+    while pos < n:
+        talk = int(rng.uniform(0.4, 1.5) * sample_rate)
+        gate[pos:pos + talk] = 1.0
+        pos += talk + int(rng.uniform(0.2, 0.6) * sample_rate)
+    
+    noise = rng.normal(0, 0.003, n)
+    return (0.3 * voiced * syllables * gate + noise).astype(np.float32)
+
+def audio_clips(durations=CLIP_DURATIONS, seed: int = 0) -> List[AudioClip]:
+    """Generate the same 16kHz mono WAV clips on every run"""
+    clips = []
+    for duration in durations:
+        rng = np.random.default_rng(seed + int(duration * 1000))
+        audio = _speech_like(duration, CLIP_SAMPLE_RATE, rng)
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, CLIP_SAMPLE_RATE, format="WAV", subtype="PCM_16")
+        clips.append(AudioClip(f"clip_{duration:g}s", duration, buffer.getvalue()))
+    return clips
+
+def text_samples(seed: int = 0) -> List[TextSample]:
+    """Generate short, medium and long texts (the API caps TTS input at 1000 characters)"""
+    rng = np.random.default_rng(seed)
+    
+    def sentences(count: int, words: int) -> str:
+        out = []
+        for _ in range(count):
+            picked = rng.choice(_WORDS, size=words)
+            out.append(" ".join(picked).capitalize() + ".")
+        return " ".join(out)
+    
+    return [
+        TextSample("text_short", sentences(1, 6)),
+        TextSample("text_medium", sentences(4, 10)),
+        TextSample("text_long", sentences(12, 12)[:1000])
+    ]
@@ -0,0 +1,295 @@
+"""Measure throughput, latency percentiles and RSS of the main API paths
+
+Examples (from the backend directory):
+
+    # Pipeline overhead only: in-process app, stub models that cost nothing
+    python -m benchmarks.run --backend stub --output stub.json
+
+    # Stub models that run at 0.1x real time
+    python -m benchmarks.run --backend stub --rtf 0.1
+
+    # Real Whisper/Kokoro, in process
+    python -m benchmarks.run --backend real --concurrency 1,2,4
+
+    # A server started separately with uvicorn and RATE_LIMIT_ENABLED=false
+    # (pass its pid to sample its RSS)
+    python -m benchmarks.run --url http://127.0.0.1:8000 --server-pid 12345
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+import httpx
+import numpy as np
+from benchmarks.corpus import CORPUS_VERSION, audio_clips, text_samples
+from config import settings
+
+logger = logging.getLogger("benchmarks")
+
+SCENARIOS = ("stt", "tts", "conversation", "detect_language")
+
+def _rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Current resident set size of a process (this one by default)"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def _peak_rss_bytes() -> int:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _summarize(latencies: List[float]) -> dict:
+    if not latencies:
+        return {}
+    ms = np.array(latencies) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "mean": round(float(ms.mean()), 3),
+        "max": round(float(ms.max()), 3)
+    }
+
+async def _run_level(call: Callable[[], Awaitable[int]], requests: int, concurrency: int) -> dict:
+    """Issue ``requests`` calls with at most ``concurrency`` in flight
+    
+    Requests shed by admission control (503) are counted as ``rejected``,
+    any other non-200 outcome as ``errors``.
+    """
+    latencies = []
+    errors = rejected = 0
+    remaining = iter(range(requests))
+    
+    async def worker():
+        nonlocal errors, rejected
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await call()
+            except Exception as e:
+                logger.debug(f"Request failed: {e}")
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status == 503:
+                rejected += 1
+            elif status != 200:
+                errors += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rejected": rejected,
+        "duration_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": _summarize(latencies)
+    }
+
+class Benchmark:
+    """Builds one request callable per scenario and corpus entry"""
+    
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+    
+    def cases(self, scenario: str):
+        if scenario in ("stt", "detect_language"):
+            for clip in audio_clips():
+                yield clip.name, self._call(scenario, clip.wav)
+        else:
+            for sample in text_samples():
+                yield sample.name, self._call(scenario, sample.text)
+    
+    def _call(self, scenario: str, payload) -> Callable[[], Awaitable[int]]:
+        """Get a callable that makes one request and returns its HTTP status"""
+        async def stt():
+            files = {"audio": ("clip.wav", payload, "audio/wav")}
+            response = await self.client.post("/api/v1/stt", files=files)
+            return response.status_code
+        
+        async def tts():
+            response = await self.client.post("/api/v1/tts", json={"text": payload, "format": "wav"})
+            return response.status_code
+        
+        async def conversation():
+            # The endpoint answers 200 without audio when synthesis fails or is shed
+            response = await self.client.post("/api/v1/conversation", json={"message": payload[:400]})
+            if response.status_code == 200 and response.json().get("audio_url") is None:
+                return 503
+            return response.status_code
+        
+        calls = itertools.count()
+        
+        async def detect_language():
+            # Results are cached by audio hash, so the last sample is nudged on
+            # every call to measure detection itself rather than cache hits
+            audio = bytearray(payload)
+            audio[-2:] = (next(calls) % 65536).to_bytes(2, "little")
+            files = {"audio": ("clip.wav", bytes(audio), "audio/wav")}
+            response = await self.client.post("/api/v1/stt/detect-language", files=files)
+            return response.status_code
+        
+        return {"stt": stt, "tts": tts, "conversation": conversation, "detect_language": detect_language}[scenario]
+
+async def _in_process_app(backend: str, rtf: float, tts_cache: bool, stt_cache: bool):
+    """Import the app and swap in freshly initialized (stub or real) services"""
+    workdir = tempfile.mkdtemp(prefix="valper-bench-")
+    settings.TEMP_AUDIO_DIR = os.path.join(workdir, "audio")
+    settings.JOBS_DIR = os.path.join(workdir, "jobs")
+    settings.TTS_CACHE_ENABLED = tts_cache
+    settings.STT_RESULT_CACHE_ENABLED = stt_cache
+    # Every benchmark request comes from the same client
+    settings.RATE_LIMIT_ENABLED = False
+    
+    from app import main
+    from app.api import routes
+    
+    if backend == "stub":
+        from benchmarks.stubs import StubSTTService, StubTTSService
+        stt_service, tts_service = StubSTTService(rtf), StubTTSService(rtf)
+    else:
+        from app.services.stt_service import STTService
+        from app.services.tts_service import TTSService
+        stt_service, tts_service = STTService(), TTSService()
+    
+    await stt_service.initialize()
+    await tts_service.initialize()
+    tts_service.audio_store.start()
+    
+    main.stt_service = routes.stt_service = stt_service
+    main.tts_service = routes.tts_service = tts_service
+    return main.app, stt_service, tts_service
+
+async def run(args) -> dict:
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    server_pid = args.server_pid
+    
+    stt_service = tts_service = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        app, stt_service, tts_service = await _in_process_app(args.backend, args.rtf, args.tts_cache, args.stt_cache)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+    
+    bench = Benchmark(client)
+    results = []
+    try:
+        for scenario in scenarios:
+            for name, call in bench.cases(scenario):
+                for _ in range(args.warmup):
+                    await call()
+                for concurrency in levels:
+                    rss_before = _rss_bytes(server_pid)
+                    level = await _run_level(call, args.requests, concurrency)
+                    rss_after = _rss_bytes(server_pid)
+                    level.update({
+                        "scenario": scenario,
+                        "input": name,
+                        "concurrency": concurrency,
+                        "rss_bytes": {
+                            "before": rss_before,
+                            "after": rss_after,
+                            "peak": None if server_pid else _peak_rss_bytes()
+                        }
+                    })
+                    results.append(level)
+                    latency = level["latency_ms"]
+                    print(f"{scenario:16} {name:12} c={concurrency:<3} "
+                          f"{level['throughput_rps']:8.2f} req/s  p50 {latency.get('p50', 0):9.2f} ms  "
+                          f"p95 {latency.get('p95', 0):9.2f} ms  p99 {latency.get('p99', 0):9.2f} ms  "
+                          f"errors {level['errors']}  rejected {level['rejected']}", flush=True)
+    finally:
+        await client.aclose()
+        if tts_service:
+            await tts_service.audio_store.stop()
+    
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "corpus_version": CORPUS_VERSION,
+            "target": args.url or f"in-process:{args.backend}",
+            "rtf": args.rtf if not args.url and args.backend == "stub" else None,
+            "tts_cache": args.tts_cache if not args.url else None,
+            "stt_cache": args.stt_cache if not args.url else None,
+            "requests_per_level": args.requests,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "WHISPER_MODEL": settings.WHISPER_MODEL,
+                "STT_BATCH_ENABLED": settings.STT_BATCH_ENABLED,
+                "STT_BATCH_MAX_SIZE": settings.STT_BATCH_MAX_SIZE,
+                "TTS_WORKERS": settings.TTS_WORKERS,
+                "TTS_MAX_QUEUE": settings.TTS_MAX_QUEUE
+            }
+        },
+        "results": results
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Valper AI API")
+    parser.add_argument("--backend", choices=("stub", "real"), default="stub",
+                        help="Models used by the in-process app (default: stub)")
+    parser.add_argument("--rtf", type=float, default=0.0,
+                        help="Stub model real-time factor; 0 measures pipeline overhead only")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="Pid of the --url server, to sample its RSS")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per input and concurrency level")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per input")
+    parser.add_argument("--tts-cache", action="store_true",
+                        help="Keep the TTS audio cache on (repeated texts then measure cache hits)")
+    parser.add_argument("--stt-cache", action="store_true",
+                        help="Keep the STT result cache on (repeated clips then measure cache hits)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+    
+    # Per-request service logs would dominate the output and the timings
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Stand-in Whisper and Kokoro backends
+
+The stub services keep everything the real services do around the model
+(decoding, batching, the model registry, the TTS worker pool, encoding,
+caching, storage) and replace only model inference. With ``rtf`` at
+0 a benchmark measures pure pipeline overhead; a non-zero real-time factor
+makes the stubs sleep like a model of that speed would.
+"""
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+import numpy as np
+from config import settings
+from app.services.audio_decode import WHISPER_SAMPLE_RATE
+from app.services.language_detect import first_voiced_clip
+from app.services.metrics import timed
+from app.services.stt_service import STTService
+from app.services.tts_service import KOKORO_SAMPLE_RATE, TTSService
+
+# Seconds of speech Kokoro renders per input character, roughly
+_SECONDS_PER_CHAR = 0.06
+
+class StubWhisperModel:
+    """Answers like a Whisper model, spending ``rtf`` seconds per second of audio"""
+    
+    def __init__(self, model_name: str, rtf: float = 0.0):
+        self.model_name = model_name
+        self.rtf = rtf
+        self.dims = SimpleNamespace(n_mels=80)
+        self.device = SimpleNamespace(type="cpu")
+    
+    def parameters(self):
+        return []
+    
+    def buffers(self):
+        return []
+    
+    def modules(self):
+        return []
+    
+    def _spend(self, audio_seconds: float):
+        if self.rtf > 0:
+            time.sleep(audio_seconds * self.rtf)
+    
+    def transcribe(self, audio: np.ndarray, **options) -> dict:
+        duration = len(audio) / WHISPER_SAMPLE_RATE
+        self._spend(duration)
+        text = f"stub transcript of {duration:.1f} seconds"
+        return {
+            "text": text,
+            "language": options.get("language") or "en",
+            "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text}]
+        }
+    
+    def detect_language(self, audio: np.ndarray) -> dict:
+        self._spend(min(len(audio) / WHISPER_SAMPLE_RATE, 30.0) * 0.1)
+        return {"en": 0.9, "es": 0.1}
+
+class StubSTTService(STTService):
+    """STTService with Whisper inference replaced by StubWhisperModel"""
+    
+    def __init__(self, rtf: float = 0.0):
+        self.rtf = rtf
+        super().__init__()
+    
+    def _load_model(self, model_name: str) -> Any:
+        return StubWhisperModel(model_name, self.rtf)
+    
+    def _transcribe_batch(self, model: Any, audios: List[np.ndarray], language: Optional[str], task: str,
+                          prompt: Optional[str] = None) -> List[dict]:
+        # A batch pass costs about as much as its longest clip
+        with timed("stt", "batch_decode", model.model_name):
+            model._spend(max(len(audio) for audio in audios) / WHISPER_SAMPLE_RATE)
+            results = [model.transcribe(audio, language=language) for audio in audios]
+        for audio, result in zip(audios, results):
+            result["duration"] = len(audio) / WHISPER_SAMPLE_RATE
+        return results
+    
+    def _detect_language_array(self, model: Any, audio: np.ndarray) -> dict:
+        clip = first_voiced_clip(audio, settings.STT_DETECT_SECONDS)
+        with timed("stt", "language_detect", model.model_name):
+            probs = model.detect_language(clip)
+        language = max(probs, key=probs.get)
+        return {"language": language, "confidence": probs[language], "all_probabilities": probs}
+
+class StubKPipeline:
+    """Yields Kokoro-shaped (graphemes, phonemes, audio) tuples, one per line of text"""
+    
+    def __init__(self, rtf: float = 0.0):
+        self.rtf = rtf
+        self.model = None
+        self.voices = {}
+        self.g2p = lambda text: (text, None)
+    
+    def load_voice(self, voice: str) -> np.ndarray:
+        return np.zeros((510, 1, 256), dtype=np.float32)
+    
+    def __call__(self, text: str, voice: Any = None):
+        for line in filter(None, (line.strip() for line in text.split("\n"))):
+            self.g2p(line)
+            seconds = len(line) * _SECONDS_PER_CHAR
+            if self.rtf > 0:
+                time.sleep(seconds * self.rtf)
+            t = np.arange(int(seconds * KOKORO_SAMPLE_RATE), dtype=np.float32) / KOKORO_SAMPLE_RATE
+            yield line, line, 0.2 * np.sin(2 * np.pi * 180 * t)
+
+class StubTTSService(TTSService):
+    """TTSService with Kokoro inference replaced by StubKPipeline"""
+    
+    def __init__(self, rtf: float = 0.0):
+        self.rtf = rtf
+        super().__init__()
+    
+    def _build_pipeline(self, lang_code: str, model=None) -> StubKPipeline:
+        return StubKPipeline(self.rtf)
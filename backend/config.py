@@ -10,10 +10,111 @@ class Settings:
     # Model Paths
     MODELS_DIR: str = os.getenv("MODELS_DIR", "models")
     WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "base")
+    # Converted models are saved here and reloaded on the next start (empty disables it)
+    MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "")
+    # Whisper inference backend: fp32, int8 (dynamic quantization, CPU only),
+    # compile (torch.compile'd encoder), or a combination such as int8+compile
+    STT_BACKEND: str = os.getenv("STT_BACKEND", "fp32")
+    STT_INTRA_OP_THREADS: int = int(os.getenv("STT_INTRA_OP_THREADS", "0"))
+    STT_INTER_OP_THREADS: int = int(os.getenv("STT_INTER_OP_THREADS", "0"))
+    STT_MODEL_MEMORY_BYTES: int = int(os.getenv("STT_MODEL_MEMORY_BYTES", str(2 * 1024 * 1024 * 1024)))
+    
+    # STT Upload Limits (0 disables a limit)
+    STT_MAX_UPLOAD_BYTES: int = int(os.getenv("STT_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    STT_MAX_DURATION_S: float = float(os.getenv("STT_MAX_DURATION_S", "600"))
+    STT_LONG_FORM_MAX_UPLOAD_BYTES: int = int(os.getenv("STT_LONG_FORM_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+    STT_LONG_FORM_MAX_DURATION_S: float = float(os.getenv("STT_LONG_FORM_MAX_DURATION_S", str(4 * 3600)))
     
     # Audio Settings
     TEMP_AUDIO_DIR: str = os.getenv("TEMP_AUDIO_DIR", "backend/temp/audio")
     SAMPLE_RATE: int = int(os.getenv("SAMPLE_RATE", "16000"))
+    AUDIO_TTL_SECONDS: float = float(os.getenv("AUDIO_TTL_SECONDS", "3600"))
+    AUDIO_MAX_BYTES: int = int(os.getenv("AUDIO_MAX_BYTES", str(256 * 1024 * 1024)))
+    AUDIO_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("AUDIO_SWEEP_INTERVAL_SECONDS", "60"))
+    
+    # STT Batching Settings
+    # Off by default: batched clips get one greedy decode and a single segment, without timestamps
+    STT_BATCH_ENABLED: bool = os.getenv("STT_BATCH_ENABLED", "False").lower() == "true"
+    STT_BATCH_MAX_SIZE: int = int(os.getenv("STT_BATCH_MAX_SIZE", "8"))
+    STT_BATCH_MAX_WAIT_MS: float = float(os.getenv("STT_BATCH_MAX_WAIT_MS", "20"))
+    
+    # Language Detection Settings
+    STT_DETECT_SECONDS: float = float(os.getenv("STT_DETECT_SECONDS", "8"))
+    STT_LANGUAGE_CACHE_SIZE: int = int(os.getenv("STT_LANGUAGE_CACHE_SIZE", "1024"))
+    
+    # STT Result Cache Settings
+    STT_RESULT_CACHE_ENABLED: bool = os.getenv("STT_RESULT_CACHE_ENABLED", "True").lower() == "true"
+    STT_RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("STT_RESULT_CACHE_MAX_ENTRIES", "4096"))
+    STT_RESULT_CACHE_MAX_BYTES: int = int(os.getenv("STT_RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    # Results are also kept in this SQLite file across restarts (empty keeps them in memory only)
+    STT_RESULT_CACHE_DB: str = os.getenv("STT_RESULT_CACHE_DB", "")
+    STT_RESULT_CACHE_DB_MAX_BYTES: int = int(os.getenv("STT_RESULT_CACHE_DB_MAX_BYTES", str(256 * 1024 * 1024)))
+    
+    # Long-form STT Settings
+    # Every forked worker would start its own pool, each process with a full
+    # model copy, so with WORKERS > 1 windows are transcribed in-process by default
+    STT_LONG_FORM_WORKERS: int = int(os.getenv("STT_LONG_FORM_WORKERS", "0" if int(os.getenv("WORKERS", "1")) > 1 else "2"))
+    STT_LONG_FORM_WINDOW_S: float = float(os.getenv("STT_LONG_FORM_WINDOW_S", "30"))
+    STT_LONG_FORM_OVERLAP_S: float = float(os.getenv("STT_LONG_FORM_OVERLAP_S", "2"))
+    STT_LONG_FORM_MAX_JOBS: int = int(os.getenv("STT_LONG_FORM_MAX_JOBS", "100"))
+    
+    # Streaming STT Settings
+    STT_STREAM_PARTIAL_INTERVAL_MS: int = int(os.getenv("STT_STREAM_PARTIAL_INTERVAL_MS", "1000"))
+    STT_VAD_THRESHOLD_DB: float = float(os.getenv("STT_VAD_THRESHOLD_DB", "-45"))
+    STT_VAD_SILENCE_MS: int = int(os.getenv("STT_VAD_SILENCE_MS", "600"))
+    STT_STREAM_MAX_UTTERANCE_S: float = float(os.getenv("STT_STREAM_MAX_UTTERANCE_S", "30"))
+    
+    # TTS Worker Settings
+    TTS_WORKERS: int = int(os.getenv("TTS_WORKERS", "2"))
+    TTS_MAX_QUEUE: int = int(os.getenv("TTS_MAX_QUEUE", "8"))
+    TTS_RETRY_AFTER_SECONDS: int = int(os.getenv("TTS_RETRY_AFTER_SECONDS", "5"))
+    TTS_PARALLEL_MIN_CHARS: int = int(os.getenv("TTS_PARALLEL_MIN_CHARS", "200"))
+    TTS_SENTENCE_GAP_MS: int = int(os.getenv("TTS_SENTENCE_GAP_MS", "80"))
+    
+    # TTS Voice Settings
+    TTS_PRELOAD_VOICES: list = [v.strip() for v in os.getenv("TTS_PRELOAD_VOICES", "af_heart").split(",") if v.strip()]
+    TTS_MAX_LOADED_VOICES: int = int(os.getenv("TTS_MAX_LOADED_VOICES", "8"))
+    TTS_WARMUP: bool = os.getenv("TTS_WARMUP", "True").lower() == "true"
+    
+    # TTS Cache Settings
+    TTS_CACHE_ENABLED: bool = os.getenv("TTS_CACHE_ENABLED", "True").lower() == "true"
+    TTS_CACHE_MEMORY_BYTES: int = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+    TTS_CACHE_DISK_BYTES: int = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+    
+    # Job Queue Settings
+    JOBS_DIR: str = os.getenv("JOBS_DIR", "backend/temp/jobs")
+    JOBS_STT_CONCURRENCY: int = int(os.getenv("JOBS_STT_CONCURRENCY", "8"))
+    JOBS_TTS_CONCURRENCY: int = int(os.getenv("JOBS_TTS_CONCURRENCY", "2"))
+    JOBS_MAX_BATCH: int = int(os.getenv("JOBS_MAX_BATCH", "1000"))
+    # Whole multipart body of one /jobs/stt batch; each file is also held to STT_MAX_UPLOAD_BYTES
+    JOBS_MAX_UPLOAD_BYTES: int = int(os.getenv("JOBS_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+    JOBS_MAX_ATTEMPTS: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+    JOBS_RETENTION_SECONDS: float = float(os.getenv("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    
+    # Rate Limiting and Scheduling Settings
+    # Clients are identified by their X-API-Key header when it is one of
+    # RATE_LIMIT_API_KEYS (comma separated), otherwise by address
+    RATE_LIMIT_API_KEYS: list = [k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()]
+    # Off by default: behind a reverse proxy every user has the proxy's address
+    # and would share one bucket unless uvicorn runs with --proxy-headers
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "False").lower() == "true"
+    RATE_LIMIT_REQUESTS_PER_SECOND: float = float(os.getenv("RATE_LIMIT_REQUESTS_PER_SECOND", "5"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "20"))
+    RATE_LIMIT_MAX_CLIENTS: int = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+    # Requests running STT or TTS model work at once; the rest queue by priority and fair share
+    SCHEDULER_CONCURRENCY: int = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
+    # Requests that may wait for a slot in each lane before new ones get 503
+    # (0 for no limit); batch work is already bounded by the job and long-form concurrency
+    SCHEDULER_MAX_QUEUE: int = int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))
+    SCHEDULER_MAX_BATCH_QUEUE: int = int(os.getenv("SCHEDULER_MAX_BATCH_QUEUE", "0"))
+    SCHEDULER_RETRY_AFTER_SECONDS: int = int(os.getenv("SCHEDULER_RETRY_AFTER_SECONDS", "2"))
+    
+    # Multi-worker Settings
+    # With more than one worker, `python -m app.server` loads the models once
+    # and forks the workers from that process so they share the weights
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
+    WORKERS_STATE_DIR: str = os.getenv("WORKERS_STATE_DIR", "backend/temp/workers")
+    WORKER_HEARTBEAT_SECONDS: float = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "5"))
     
     # CORS Settings
     ALLOWED_ORIGINS: list = [
@@ -25,6 +126,9 @@ class Settings:
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
+    # Metrics
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "False").lower() == "true"
+    
     def __init__(self):
         # Create necessary directories
         os.makedirs(self.MODELS_DIR, exist_ok=True)
@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+# Keep the app's working files out of the source tree
+_workdir = tempfile.mkdtemp(prefix="valper-test-")
+os.environ.setdefault("TEMP_AUDIO_DIR", os.path.join(_workdir, "audio"))
+os.environ.setdefault("JOBS_DIR", os.path.join(_workdir, "jobs"))
+os.environ.setdefault("WORKERS_STATE_DIR", os.path.join(_workdir, "workers"))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from config import settings
+
+ORIGIN = {"Origin": "http://frontend.example"}
+
+def test_oversized_upload_gets_413_with_cors_headers():
+    client = TestClient(app)
+    response = client.post(
+        "/api/v1/stt",
+        headers={**ORIGIN, "Content-Length": str(settings.STT_MAX_UPLOAD_BYTES + 1)},
+        content=b"x"
+    )
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] == "*"